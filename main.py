@@ -5,7 +5,12 @@ from datetime import timedelta
 from routes.users import users_bp
 from routes.admin import admin_bp
 from routes.chatbot import chatbot_bp
+from routes.gate import gate_bp
 from extensions import mail
+from utils.mail_transport import init_mail_transport
+from modules.job_queue import start_workers
+import modules.ticket_delivery  # registers job handlers
+from modules.chatbot_logic import start_warmup
 from dotenv import load_dotenv
 
 load_dotenv() # Load .env variables
@@ -23,17 +28,31 @@ def create_app():
     app.config['MAIL_PASSWORD'] = os.getenv('MAIL_PASSWORD')
     app.config['MAIL_DEFAULT_SENDER'] = os.getenv('MAIL_USERNAME')
 
+    app.config['MAIL_POOL_SIZE'] = int(os.getenv('MAIL_POOL_SIZE', 2))
+    app.config['MAIL_BATCH_SIZE'] = int(os.getenv('MAIL_BATCH_SIZE', 20))
+
     mail.init_app(app)
+    init_mail_transport(app)
 
     with app.app_context():
         init_db()
 
+    # Background jobs (ticket emails). Set JOB_WORKER_THREADS=0 where
+    # background threads can't run (e.g. serverless) and use scripts/run_worker.py.
+    start_workers(app, threads=int(os.getenv('JOB_WORKER_THREADS', 1)))
+
+    # Load the chatbot model in the background now rather than on the first
+    # question (it takes tens of seconds; see GET /chatbot/health)
+    if os.getenv('CHATBOT_WARMUP', 'False') == 'True':
+        start_warmup()
+
     if users_bp:
         app.register_blueprint(users_bp)
     if admin_bp:
         app.register_blueprint(admin_bp, url_prefix='/admin')
     if chatbot_bp:
         app.register_blueprint(chatbot_bp, url_prefix='/chatbot')
+    app.register_blueprint(gate_bp, url_prefix='/gate')
 
     @app.route('/')
     def index():
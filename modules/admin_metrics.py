@@ -0,0 +1,139 @@
+from db import get_db
+from modules import catalog_cache
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+
+# Admin dashboard numbers and chart data, computed once and shared by every
+# dashboard load until METRICS_TTL_SECONDS pass, the catalog changes, or
+# this worker records a booking (invalidate_dashboard_metrics).
+# The browser draws the charts from the JSON; chart_png renders the same data
+# server-side (matplotlib) for clients without JavaScript, cached per data hash.
+
+METRICS_TTL_SECONDS = float(os.getenv('ADMIN_METRICS_TTL_SECONDS', 60))
+TOP_MUSEUMS = 5
+MAX_PNG_ENTRIES = 16
+
+_lock = threading.Lock()
+_cache = {'key': None, 'metrics': None, 'at': 0.0}
+_png_cache = {}
+
+def invalidate_dashboard_metrics():
+    """
+    Drops the cached metrics, e.g. after a booking is saved.
+    """
+    with _lock:
+        _cache['metrics'] = None
+
+def _compute():
+    db = get_db()
+    museums = catalog_cache.get_catalog()
+
+    top = list(db.bookings.aggregate([
+        {"$group": {"_id": "$museum_name", "count": {"$sum": 1}}},
+        {"$sort": {"count": -1}},
+        {"$limit": TOP_MUSEUMS}
+    ]))
+
+    types = {}
+    for museum in museums:
+        if museum.get('museum_type'):
+            types[museum['museum_type']] = types.get(museum['museum_type'], 0) + 1
+
+    charts = {
+        'top_museums': {
+            'labels': [item['_id'] for item in top],
+            'counts': [item['count'] for item in top]
+        },
+        'museum_types': {
+            'labels': sorted(types, key=types.get, reverse=True),
+            'counts': sorted(types.values(), reverse=True)
+        }
+    }
+    return {
+        'counts': {
+            'users': db.users.estimated_document_count(),
+            'museums': len(museums),
+            'bookings': db.bookings.estimated_document_count(),
+            'reviews': db.reviews.estimated_document_count(),
+            'feedbacks': db.feedbacks.estimated_document_count()
+        },
+        'charts': charts,
+        # Identifies the chart data; PNGs and ETags are keyed by it
+        'hash': hashlib.sha1(json.dumps(charts, sort_keys=True).encode()).hexdigest()[:16],
+        'generated_at': time.time()
+    }
+
+def get_dashboard_metrics():
+    """
+    {'counts': {...}, 'charts': {'top_museums', 'museum_types'}, 'hash', 'generated_at'}
+    """
+    key = catalog_cache.get_catalog_generation()
+    with _lock:
+        if _cache['metrics'] and _cache['key'] == key and time.time() - _cache['at'] < METRICS_TTL_SECONDS:
+            return _cache['metrics']
+
+    metrics = _compute()
+    with _lock:
+        _cache.update(key=key, metrics=metrics, at=time.time())
+    return metrics
+
+# --- Optional server-side PNGs ---
+
+CHART_COLORS = ['#8B4513', '#A0522D', '#CD853F', '#D2691E', '#DEB887', '#F4A460', '#A52A2A']
+
+def _render_top_museums(plt, data):
+    plt.figure(figsize=(7, 5))
+    # Highest value on top
+    plt.barh(data['labels'][::-1], data['counts'][::-1], color=CHART_COLORS[:len(data['labels'])][::-1])
+    plt.title('Top 5 Most Booked Museums', fontsize=12)
+    plt.xlabel('Number of Bookings', fontsize=10)
+
+def _render_museum_types(plt, data):
+    plt.figure(figsize=(7, 5))
+    colors = [CHART_COLORS[i % len(CHART_COLORS)] for i in range(len(data['counts']))]
+    wedges, _, _ = plt.pie(data['counts'], labels=None, autopct='%1.1f%%',
+                           startangle=140, pctdistance=0.85, colors=colors)
+    plt.gcf().gca().add_artist(plt.Circle((0, 0), 0.70, fc='white'))  # donut
+    plt.legend(wedges, data['labels'], title="Museum Types", loc="center left", bbox_to_anchor=(1, 0, 0.5, 1))
+    plt.title('Museum Types Distribution', fontsize=12)
+
+_RENDERERS = {'top_museums': _render_top_museums, 'museum_types': _render_museum_types}
+
+def chart_png(name, metrics=None):
+    """
+    PNG bytes for one chart, rendered only when its data changed.
+    Returns None for an unknown chart, empty data or without matplotlib.
+    """
+    if name not in _RENDERERS:
+        return None
+    metrics = metrics or get_dashboard_metrics()
+    data = metrics['charts'][name]
+    if not data['counts']:
+        return None
+
+    key = (name, metrics['hash'])
+    with _lock:
+        if key in _png_cache:
+            return _png_cache[key]
+
+    try:
+        import matplotlib
+        matplotlib.use('Agg')  # Use non-interactive backend
+        import matplotlib.pyplot as plt
+    except ImportError:
+        return None
+
+    with _lock:  # pyplot keeps global state
+        _RENDERERS[name](plt, data)
+        plt.tight_layout()
+        buf = io.BytesIO()
+        plt.savefig(buf, format='png', dpi=100)
+        plt.close()
+        if len(_png_cache) >= MAX_PNG_ENTRIES:
+            _png_cache.clear()
+        _png_cache[key] = buf.getvalue()
+        return _png_cache[key]
@@ -0,0 +1,117 @@
+from db import get_db
+from modules import catalog_cache
+import calendar
+import datetime
+import threading
+import time
+
+# Month views are cached per (museum, month). This worker drops an entry as
+# soon as it writes to that museum's inventory; bookings taken by other
+# workers show up within CACHE_TTL_SECONDS.
+CACHE_TTL_SECONDS = 30
+MAX_CACHE_ENTRIES = 2048
+
+DEFAULT_CAPACITY = 1000
+
+_lock = threading.Lock()
+_cache = {}
+
+def invalidate_availability(museum_id, tour_date=None):
+    """
+    Drops cached month views for a museum (only the month of tour_date if given).
+    """
+    month = str(tour_date)[:7] if tour_date else None
+    with _lock:
+        for key in [k for k in _cache if k[0] == str(museum_id) and (month is None or k[1] == month)]:
+            del _cache[key]
+
+def _parse_time(value):
+    try:
+        return datetime.datetime.strptime(value.strip(), '%I:%M %p').time()
+    except (AttributeError, ValueError):
+        return None
+
+def is_open_on(museum, day, now=None):
+    """
+    True if the museum takes visitors on the given date: not a weekly off
+    day, and (for today) not already past closing time.
+    """
+    off_days = {d.strip().lower() for d in (museum.get('weekly_off_days') or [])}
+    if day.strftime('%A').lower() in off_days:
+        return False
+
+    now = now or datetime.datetime.now()
+    if day < now.date():
+        return False
+    if day == now.date():
+        closing = _parse_time(museum.get('closing_time'))
+        if closing and now.time() >= closing:
+            return False
+    return True
+
+def _booked_by_day(museum_id, month):
+    # One indexed range read over the inventory counters for the month
+    now = datetime.datetime.utcnow()
+    docs = get_db().inventory.find(
+        {'museum_id': museum_id, 'tour_date': {'$gte': f"{month}-01", '$lte': f"{month}-31"}},
+        {'tour_date': 1, 'confirmed': 1, 'holds': 1}
+    )
+    booked = {}
+    for doc in docs:
+        live_holds = sum(h['tickets'] for h in doc.get('holds', []) if h.get('expires_at') and h['expires_at'] > now)
+        booked[doc['tour_date']] = doc.get('confirmed', 0) + live_holds
+    return booked
+
+def _build_month(museum, month):
+    year, mon = (int(part) for part in month.split('-'))
+    capacity = museum.get('max_daily_capacity') or DEFAULT_CAPACITY
+    booked = _booked_by_day(str(museum['_id']), month)
+    now = datetime.datetime.now()
+
+    days = []
+    for day_num in range(1, calendar.monthrange(year, mon)[1] + 1):
+        day = datetime.date(year, mon, day_num)
+        key = day.isoformat()
+        remaining = max(capacity - booked.get(key, 0), 0)
+        if not is_open_on(museum, day, now):
+            status = 'closed'
+            remaining = 0
+        elif remaining == 0:
+            status = 'sold_out'
+        else:
+            status = 'open'
+        days.append({'date': key, 'status': status, 'remaining': remaining})
+
+    return {
+        'museum_id': str(museum['_id']),
+        'month': month,
+        'capacity': capacity,
+        'opening_time': museum.get('opening_time'),
+        'closing_time': museum.get('closing_time'),
+        'weekly_off_days': museum.get('weekly_off_days') or [],
+        'days': days
+    }
+
+def get_month_availability(museum_id, month):
+    """
+    Remaining tickets per day for a museum and 'YYYY-MM' month.
+    Returns None if the museum does not exist; raises ValueError for a bad month.
+    """
+    datetime.datetime.strptime(month, '%Y-%m')
+    museum = catalog_cache.get_museum(museum_id)
+    if not museum:
+        return None
+
+    # The generation makes edits to hours/capacity invalidate the entry too
+    key = (str(museum_id), month, catalog_cache.get_catalog_generation())
+    with _lock:
+        hit = _cache.get(key)
+        if hit and time.time() - hit[1] < CACHE_TTL_SECONDS:
+            return hit[0]
+
+    result = _build_month(museum, month)
+    with _lock:
+        if len(_cache) >= MAX_CACHE_ENTRIES:
+            _cache.clear()
+        _cache[key] = (result, time.time())
+    return result
@@ -0,0 +1,161 @@
+from db import get_db
+from pymongo import ReturnDocument
+import os
+import time
+import threading
+from collections import OrderedDict
+
+# The museum catalog only changes through admin add/edit/delete and the seed
+# scripts. Each of those bumps a shared generation counter stored in
+# db.meta, so every gunicorn worker can tell when its in-memory copy is stale
+# by reading one tiny document instead of re-reading the catalog.
+VERSION_DOC_ID = 'catalog_version'
+
+# How often (seconds) a worker re-reads the shared version document.
+# 0 checks on every access.
+VERSION_CHECK_INTERVAL = float(os.getenv('CATALOG_VERSION_CHECK_SECONDS', 1))
+
+# Upper bound on memoized listing pages kept per generation. Indexes built
+# with per_generation() live outside this LRU, so page traffic never evicts them.
+MAX_MEMO_ENTRIES = 512
+
+_lock = threading.Lock()
+_state = {
+    'generation': None,   # generation the cached data was built from
+    'checked_at': 0.0,
+    'museums': None,      # list of museum documents
+    'by_id': {},          # str(_id) -> museum document
+    'categories': None
+}
+_derived = {}          # one-per-generation structures (search trees, map indexes)
+_memo = OrderedDict()  # per-request pages (search results, rating summaries), LRU
+
+def bump_catalog_version(db=None):
+    """
+    Marks the catalog as changed. Call after any write to db.museums.
+    Scripts that talk to a different database can pass their own handle.
+    """
+    db = db if db is not None else get_db()
+    doc = db.meta.find_one_and_update(
+        {'_id': VERSION_DOC_ID},
+        {'$inc': {'generation': 1}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    if db is get_db():
+        # This worker already knows; drop its copy without waiting for the next check
+        with _lock:
+            _reset(doc['generation'] if doc else None)
+    return doc['generation'] if doc else None
+
+def _reset(generation):
+    _state['generation'] = generation
+    _state['checked_at'] = time.time()
+    _state['museums'] = None
+    _state['by_id'] = {}
+    _state['categories'] = None
+    _derived.clear()
+    _memo.clear()
+
+def _current_generation(db):
+    doc = db.meta.find_one({'_id': VERSION_DOC_ID})
+    return doc['generation'] if doc else 0
+
+def _ensure_fresh():
+    # Caller holds _lock
+    now = time.time()
+    if _state['generation'] is not None and now - _state['checked_at'] < VERSION_CHECK_INTERVAL:
+        return
+    generation = _current_generation(get_db())
+    if generation != _state['generation']:
+        _reset(generation)
+    _state['checked_at'] = now
+
+def get_catalog_generation():
+    with _lock:
+        _ensure_fresh()
+        return _state['generation']
+
+def get_catalog():
+    """
+    Returns every museum document, loaded once per catalog generation.
+    """
+    with _lock:
+        _ensure_fresh()
+        if _state['museums'] is None:
+            museums = list(get_db().museums.find())
+            _state['museums'] = museums
+            _state['by_id'] = {str(m['_id']): m for m in museums}
+        return _state['museums']
+
+def get_museum(museum_id):
+    """
+    Looks up a museum by its _id (string or ObjectId) from the cached catalog.
+    """
+    get_catalog()
+    with _lock:
+        return _state['by_id'].get(str(museum_id))
+
+def patch_museum(museum_id, fields):
+    """
+    Updates fields of this worker's cached copy of one museum in place,
+    without bumping the generation (which would drop every derived cache).
+    For frequently changing fields such as rating aggregates; other
+    workers pick the change up on their next reload.
+    """
+    with _lock:
+        museum = _state['by_id'].get(str(museum_id))
+        if museum is not None:
+            museum.update(fields)
+
+def get_categories():
+    """
+    Sorted, non-empty museum_type values.
+    """
+    museums = get_catalog()
+    with _lock:
+        if _state['categories'] is None:
+            _state['categories'] = sorted({m.get('museum_type') for m in museums if m.get('museum_type')})
+        return _state['categories']
+
+def per_generation(key, loader):
+    """
+    Caches loader() under key until the catalog generation changes, outside
+    the page LRU. For the few structures built from the whole catalog
+    (KD-tree, map indexes, chatbot name index).
+    """
+    with _lock:
+        _ensure_fresh()
+        if key in _derived:
+            return _derived[key]
+        generation = _state['generation']
+
+    value = loader()
+
+    with _lock:
+        # Don't store a result computed against a generation that has since moved on
+        if _state['generation'] == generation:
+            _derived[key] = value
+    return value
+
+def memoize(key, loader):
+    """
+    Caches loader() under key until the catalog generation changes, keeping
+    the MAX_MEMO_ENTRIES most recently used. For per-request views such as
+    listing pages.
+    """
+    with _lock:
+        _ensure_fresh()
+        if key in _memo:
+            _memo.move_to_end(key)
+            return _memo[key]
+        generation = _state['generation']
+
+    value = loader()
+
+    with _lock:
+        if _state['generation'] == generation:
+            _memo[key] = value
+            while len(_memo) > MAX_MEMO_ENTRIES:
+                _memo.popitem(last=False)
+    return value
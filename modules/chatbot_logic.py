@@ -1,9 +1,20 @@
+import difflib
+import math
 import os
+import re
+import threading
+import time
+from collections import Counter
+from concurrent.futures import TimeoutError as FutureTimeout
+from queue import Empty, Full
+from utils.batch_scheduler import BatchScheduler
+from modules import catalog_cache, response_cache
 
 # Try to import ML libraries, handle missing libs for non-GPU/Low-Memory environments
 try:
     import torch
-    from transformers import AutoTokenizer, AutoModelForCausalLM, pipeline
+    from transformers import pipeline
+    from transformers import StoppingCriteria, StoppingCriteriaList, TextIteratorStreamer
     ML_AVAILABLE = True
 except ImportError:
     ML_AVAILABLE = False
@@ -13,87 +24,454 @@ except ImportError:
 CLOUD_MODEL_ID = "Qwen/Qwen2.5-0.5B-Instruct"
 LOCAL_MODEL_PATH = os.path.join(os.getcwd(), "models", "qwen_1_8b_chat")
 
+# The model takes tens of seconds to load, so it is loaded once, in the
+# background (start_warmup), and never inside a request: until it is ready
+# get_chatbot_response answers with a short "warming up" reply.
+# Set CHATBOT_WARMUP=True to start loading when the app starts instead of on
+# the first question.
+RETRY_AFTER_SECONDS = float(os.getenv('CHATBOT_RETRY_SECONDS', 60))
+
+# Questions arriving together are answered in one batched generate() call
+# (see _generate_batch): the scheduler waits up to CHATBOT_BATCH_WAIT_MS for
+# up to CHATBOT_BATCH_SIZE prompts. A question waits at most
+# CHATBOT_TIMEOUT_SECONDS for its answer.
+MAX_NEW_TOKENS = 200
+BATCH_SIZE = int(os.getenv('CHATBOT_BATCH_SIZE', 8))
+BATCH_WAIT_SECONDS = float(os.getenv('CHATBOT_BATCH_WAIT_MS', 10)) / 1000
+REQUEST_TIMEOUT_SECONDS = float(os.getenv('CHATBOT_TIMEOUT_SECONDS', 60))
+MAX_QUEUED = int(os.getenv('CHATBOT_MAX_QUEUED', 64))
+# Streamed answers (stream_chatbot_response) each run their own generate();
+# at most this many at once
+MAX_STREAMS = int(os.getenv('CHATBOT_MAX_STREAMS', 2))
+
 _generator = None
+_lock = threading.Lock()
+_state = {
+    'status': 'idle',  # idle | loading | ready | failed | disabled
+    'model': None,
+    'device': None,
+    'error': None,
+    'started_at': None,
+    'finished_at': None,
+    'load_seconds': None,
+    'first_inference_seconds': None,
+    'thread': None
+}
+
+def _load_model():
+    # Determine which model to load
+    if os.path.exists(LOCAL_MODEL_PATH):
+        model_source = LOCAL_MODEL_PATH
+        print(f"Loading Local AI Model: {model_source}...")
+    else:
+        model_source = CLOUD_MODEL_ID
+        print(f"Local model not found. Downloading/Loading Cloud AI Model: {model_source}...")
+
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    print(f"Using device: {device}")
+    _state.update(model=model_source, device=device)
 
-def get_generator():
+    # Use float16 for GPU, float32 for CPU (or bfloat16 if supported)
+    torch_dtype = torch.float16 if device == "cuda" else torch.float32
+
+    return pipeline(
+        "text-generation",
+        model=model_source,
+        torch_dtype=torch_dtype,
+        device_map="auto"
+    )
+
+def _warmup():
+    global _generator
+    try:
+        generator = _load_model()
+        _state['load_seconds'] = round(time.time() - _state['started_at'], 2)
+        print(f"AI Model {_state['model']} loaded successfully in {_state['load_seconds']}s.")
+
+        # Batches are left-padded so every prompt ends where generation starts
+        generator.tokenizer.padding_side = 'left'
+        if generator.tokenizer.pad_token is None:
+            generator.tokenizer.pad_token = generator.tokenizer.eos_token
+
+        # One tiny generation so the first real question doesn't pay for
+        # lazy kernel/allocator setup
+        t0 = time.time()
+        generator("Hello", max_new_tokens=1, do_sample=False)
+        _state['first_inference_seconds'] = round(time.time() - t0, 2)
+
+        with _lock:
+            _generator = generator
+            _state.update(status='ready', error=None, finished_at=time.time(), thread=None)
+    except Exception as e:
+        print(f"CRITICAL: Failed to load AI model. {e}")
+        with _lock:
+            _state.update(status='failed', error=str(e), finished_at=time.time(), thread=None)
+
+def start_warmup():
     """
-    Lazily initializes the text generation pipeline.
-    Checks for local model first, then falls back to Hugging Face Hub.
+    Starts loading the model in a background thread, once: concurrent
+    callers share the same load. A failed load is retried after
+    RETRY_AFTER_SECONDS. Returns the current status.
     """
-    global _generator
-    
     if not ML_AVAILABLE:
-        return None
+        _state['status'] = 'disabled'
+        return _state['status']
 
-    if _generator is None:
-        try:
-            # Determine which model to load
-            if os.path.exists(LOCAL_MODEL_PATH):
-                model_source = LOCAL_MODEL_PATH
-                print(f"Loading Local AI Model: {model_source}...")
-            else:
-                model_source = CLOUD_MODEL_ID
-                print(f"Local model not found. Downloading/Loading Cloud AI Model: {model_source}...")
-            
-            device = "cuda" if torch.cuda.is_available() else "cpu"
-            print(f"Using device: {device}")
-
-            # Use float16 for GPU, float32 for CPU (or bfloat16 if supported)
-            torch_dtype = torch.float16 if device == "cuda" else torch.float32
-            
-            _generator = pipeline(
-                "text-generation",
-                model=model_source,
-                torch_dtype=torch_dtype,
-                device_map="auto"
-            )
-            print(f"AI Model {model_source} loaded successfully.")
-            
-        except Exception as e:
-            print(f"CRITICAL: Failed to load AI model. {e}")
-            return None
-            
+    with _lock:
+        status = _state['status']
+        retry = status == 'failed' and time.time() - _state['finished_at'] >= RETRY_AFTER_SECONDS
+        if status == 'idle' or retry:
+            _state.update(status='loading', error=None, started_at=time.time(), finished_at=None,
+                          load_seconds=None, first_inference_seconds=None)
+            _state['thread'] = threading.Thread(target=_warmup, name='chatbot-warmup', daemon=True)
+            _state['thread'].start()
+        return _state['status']
+
+def get_generator(wait=False):
+    """
+    The text generation pipeline, or None while it is still loading (or
+    failed, or ML is unavailable). Starts the background load if needed;
+    wait=True blocks until that load finishes (scripts, not requests).
+    """
+    if _generator is not None:
+        return _generator
+    if start_warmup() == 'loading' and wait:
+        thread = _state['thread']
+        if thread is not None:
+            thread.join()
     return _generator
 
+_inference = {'tokens': 0, 'seconds': 0.0}
+
+def _generate_batch(prompts):
+    """
+    Runs one padded generate() over all prompts; returns one answer each.
+    """
+    tokenizer, model = _generator.tokenizer, _generator.model
+    # The chat template already includes the special tokens
+    inputs = tokenizer(prompts, return_tensors='pt', padding=True, add_special_tokens=False).to(model.device)
+
+    started = time.time()
+    with torch.no_grad():
+        output = model.generate(
+            **inputs,
+            max_new_tokens=MAX_NEW_TOKENS,
+            do_sample=True,
+            temperature=0.7,
+            top_k=50,
+            top_p=0.95,
+            pad_token_id=tokenizer.pad_token_id
+        )
+    # Only the newly generated tokens; the prompt is the first input_len columns
+    new_tokens = output[:, inputs['input_ids'].shape[1]:]
+
+    with _lock:
+        _inference['tokens'] += int((new_tokens != tokenizer.pad_token_id).sum())
+        _inference['seconds'] += time.time() - started
+    return [text.strip() for text in tokenizer.batch_decode(new_tokens, skip_special_tokens=True)]
+
+_stream_slots = threading.BoundedSemaphore(MAX_STREAMS)
+
+_scheduler = BatchScheduler(_generate_batch, batch_size=BATCH_SIZE, max_wait=BATCH_WAIT_SECONDS,
+                            max_queue=MAX_QUEUED, name='chatbot-inference')
+
+def chatbot_status():
+    """
+    Readiness, load timings, inference throughput and cache hit rates for
+    /chatbot/health.
+    """
+    if not ML_AVAILABLE:
+        _state['status'] = 'disabled'
+    status = {k: v for k, v in _state.items() if k != 'thread'}
+    if status['status'] == 'loading':
+        status['loading_seconds'] = round(time.time() - status['started_at'], 2)
+
+    with _lock:
+        tokens, seconds = _inference['tokens'], _inference['seconds']
+    status['inference'] = {
+        **_scheduler.stats(),
+        'tokens_generated': tokens,
+        'tokens_per_second': round(tokens / seconds, 1) if seconds else None
+    }
+    status['cache'] = response_cache.cache_stats()
+    return status
+
+# --- Intent router ---
+# Questions about a museum's hours, fee, weekly off days, location or
+# accessibility are answered straight from the cached catalog (no model, no
+# hallucinated timings). Everything else falls through to the model.
+
+# Keywords match at the start of a word ('museums', 'paintings', 'visiting'),
+# not anywhere inside one ('start' is not 'art', 'this' is not 'hi')
+DOMAIN_RE = re.compile(r"\b(?:" + "|".join([
+    'museum', 'art', 'histor', 'ticket', 'book', 'price', 'fee',
+    'entry', 'location', 'located', 'time', 'timing', 'hour', 'guide', 'tour', 'exhibit',
+    'gallery', 'galleries', 'statue', 'painting', 'ancient', 'culture',
+    'heritage', 'india', 'delhi', 'mumbai', 'payment', 'cost',
+    'open', 'close', 'map', 'contact', 'address', 'recommend',
+    'place', 'visit', 'best', 'famous', 'wheelchair', 'accessib', 'parking'
+]) + r")")
+GREETING_RE = re.compile(r"\b(?:hi|hello|hey|good morning|good evening|help|who are you|thank|thanks)\b")
+
+WEEKDAYS = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
+
+# Checked in order; a question can carry several ("timings and fees of ...").
+# Question words only count next to what they ask about: "when was it
+# established", "where did the collection come from" and "how much time do
+# I need" are not hours, location or fee questions.
+INTENT_PATTERNS = [
+    ('off_days', re.compile(r"\b(?:weekly off|off days?|days? off|holidays?|closed on|which days?|what days?|"
+                            r"weekends?|" + "|".join(WEEKDAYS) + r")\b")),
+    ('hours', re.compile(r"\b(?:timings?|hours?|open(?:s|ing)?|clos(?:e|es|ing)|what time)\b")),
+    ('fee', re.compile(r"\b(?:fees?|prices?|pricing|costs?|charges?|entry (?:fees?|prices?|costs?|charges?|tickets?)|"
+                       r"tickets? (?:prices?|costs?|rates?)|how much\b.*\b(?:tickets?|entry|fees?|costs?|charges?|pay))\b")),
+    ('location', re.compile(r"\b(?:where (?:is|are)|wheres|located|location|address|which city|how to reach|directions?)\b")),
+    ('accessibility', re.compile(r"\b(?:wheelchair|accessib\w*|disabled|disabilit\w*|ramps?|handicap\w*|parking)\b")),
+]
+
+# Every word of a question answered from the catalog must be one of these,
+# the museum's name or its city/state; any other content word ("art",
+# "photography", "established") means the model should answer instead.
+ANSWERABLE_WORDS = frozenset(WEEKDAYS + """
+    weekly off offs day days holiday holidays closed close closes closing open opens opening
+    weekend weekends timing timings time times hour hours what when which where wheres how much
+    fee fees price prices pricing cost costs charge charges entry ticket tickets rate rates pay
+    located location address city reach directions direction
+    wheelchair accessible accessibility disabled disability ramp ramps handicap parking available
+    is are the a an of at in on for to it its does do can i we me my you please tell about
+    museum museums today tomorrow now per person visit visiting there any have has and or this that
+""".split())
+
+# Words that never identify a museum on their own
+NAME_STOPWORDS = frozenset(['the', 'of', 'and', 'a', 'an', 'in', 'at', 'for', 'is', 'it', 'to', 'on', 'does', 'do',
+                            'what', 'when', 'where', 'which', 'how', 'are', 'there', 'me', 'tell', 'about', 'much'])
+# Share of the query-matched name weight needed to accept a museum
+MIN_NAME_COVERAGE = 0.6
+FUZZY_CUTOFF = 0.75
+
+def _normalize(text):
+    return ' '.join(re.sub(r'[^a-z0-9]+', ' ', (text or '').lower()).split())
+
 def is_domain_relevant(query):
     """
     Checks if the query is related to the museum domain.
     """
     query_lower = query.lower()
-    
-    domain_keywords = [
-        'museum', 'art', 'history', 'ticket', 'booking', 'price', 
-        'entry', 'location', 'time', 'guide', 'tour', 'exhibit', 
-        'gallery', 'statue', 'painting', 'ancient', 'culture', 
-        'heritage', 'india', 'delhi', 'mumbai', 'payment', 'cost',
-        'open', 'close', 'map', 'contact', 'address', 'recommend',
-        'place', 'visit', 'best', 'famous'
-    ]
-    
-    allow_list = ['hi', 'hello', 'hey', 'good morning', 'good evening', 'help', 'who are you', 'thank', 'thanks']
-    
-    if any(word in query_lower for word in allow_list):
-        return True
-        
-    return any(keyword in query_lower for keyword in domain_keywords)
+    return bool(GREETING_RE.search(query_lower) or DOMAIN_RE.search(query_lower))
 
-def get_chatbot_response(query, history=None):
+def _name_index():
+    def load():
+        museums = catalog_cache.get_catalog()
+        tokens, phrases, postings, freq = {}, {}, {}, Counter()
+        for museum in museums:
+            museum_id = str(museum['_id'])
+            sequence = [w for w in _normalize(museum.get('museum_name')).split() if w not in NAME_STOPWORDS]
+            phrases[museum_id] = ' '.join(sequence)
+            tokens[museum_id] = set(sequence)
+            freq.update(tokens[museum_id])
+            for word in tokens[museum_id]:
+                postings.setdefault(word, []).append(museum_id)
+
+        # Rare words ('salar', 'jung') identify a museum; common ones ('museum') barely do
+        weight = {word: math.log((len(museums) + 1) / n) for word, n in freq.items()}
+        by_letter = {}
+        for word in freq:
+            by_letter.setdefault(word[0], []).append(word)
+        return {'tokens': tokens, 'phrases': phrases, 'postings': postings, 'weight': weight, 'by_letter': by_letter}
+
+    return catalog_cache.per_generation(('chatbot_name_index',), load)
+
+def _query_words(index, normalized):
+    # The query's words in order (stopwords dropped), each mapped onto a name
+    # word where possible, tolerating typos ('salar jang' -> 'salar jung').
+    # Returns (mapped sequence, {mapped word: original words}, exactly spelled words)
+    sequence, originals, exact = [], {}, set()
+    for word in normalized.split():
+        if word in NAME_STOPWORDS:
+            continue
+        mapped = word
+        if word in index['weight']:
+            exact.add(word)
+        elif len(word) >= 4:
+            close = difflib.get_close_matches(word, index['by_letter'].get(word[0], []), n=1, cutoff=FUZZY_CUTOFF)
+            if close:
+                mapped = close[0]
+        sequence.append(mapped)
+        originals.setdefault(mapped, set()).add(word)
+    return sequence, originals, exact
+
+def _match_museums(normalized):
+    # (museums the query names, the query words naming them)
+    index = _name_index()
+    sequence, originals, exact = _query_words(index, normalized)
+    words = set(sequence)
+    mapped_query = f" {' '.join(sequence)} "
+
+    ranked = {}
+    # Candidates share at least one correctly spelled word with the query, so
+    # a typo alone ('start' ~ 'state') never picks a museum
+    for museum_id in {m for word in exact for m in index['postings'].get(word, [])}:
+        name_words = index['tokens'][museum_id]
+        total = sum(index['weight'][w] for w in name_words) or 1.0
+        matched = sum(index['weight'][w] for w in name_words & words)
+        if matched / total < MIN_NAME_COVERAGE:
+            continue
+        # The most specific name wins: the full name written out in order
+        # beats scattered words ('Museum of Art and Photography' in "art at
+        # Indian Museum ... photography"), and a longer name beats the ones
+        # it contains ('National Rail Museum' over 'Rail Museum'); on equal
+        # words, the name with the fewest left over ('Salar Jung Museum' over
+        # 'Salar Jung Museum Annex')
+        in_order = f" {index['phrases'][museum_id]} " in mapped_query
+        ranked[museum_id] = (in_order, matched >= total, round(matched, 6), round(matched / total, 6))
+    if not ranked:
+        return [], set()
+
+    best = max(ranked.values())
+    matches = [catalog_cache.get_museum(m) for m, rank in ranked.items() if rank == best]
+    if len(matches) > 1:
+        # 'National Museum Delhi': let the city pick between same-named museums
+        in_city = [m for m in matches if m.get('city') and f" {_normalize(m['city'])} " in f" {normalized} "]
+        matches = in_city or matches
+
+    used = set()
+    for museum in matches:
+        for word in index['tokens'][str(museum['_id'])]:
+            used |= originals.get(word, set())
+
+    # The catalog has a few duplicate listings; one per name and city
+    unique = {}
+    for museum in sorted(matches, key=lambda m: (m.get('museum_name') or '', m.get('city') or '', str(m['_id']))):
+        unique.setdefault((museum.get('museum_name'), museum.get('city')), museum)
+    return list(unique.values()), used
+
+def find_museums(query):
     """
-    Generates a response using the loaded model.
+    Museums the query names, best match first (several when a name is
+    shared, e.g. 'Government Museum'). Fuzzy: tolerates typos and partial names.
     """
-    if not query:
-        return "I didn't catch that. Could you please repeat?"
+    return _match_museums(_normalize(query))[0]
 
-    if not is_domain_relevant(query):
-        return "I specialize in Indian museums and history. Please ask me about museum visits, tickets, or historical artifacts!"
+def route_query(query):
+    """
+    {'intents': [...], 'museums': [...], 'other_words': [...]} for a
+    question; other_words are content words the catalog can't answer.
+    """
+    normalized = _normalize(query)
+    intents = [name for name, pattern in INTENT_PATTERNS if pattern.search(normalized)]
+    try:
+        museums, name_words = _match_museums(normalized)
+    except Exception as e:
+        print(f"Chatbot: museum lookup unavailable: {e}")
+        museums, name_words = [], set()
 
-    if not ML_AVAILABLE:
-        return "I am currently in 'Lite Mode' due to server limits. The AI Brain is disabled, but you can still use the Booking and Museum features!"
+    places = set()
+    for museum in museums:
+        places.update(_normalize(f"{museum.get('city', '')} {museum.get('state', '')}").split())
+    other_words = [w for w in normalized.split()
+                   if w not in ANSWERABLE_WORDS and w not in NAME_STOPWORDS and w not in name_words and w not in places]
+    return {'intents': intents, 'museums': museums, 'other_words': other_words, 'normalized': normalized}
+
+def _label(museum):
+    return f"{museum.get('museum_name')} ({museum['city']})" if museum.get('city') else museum.get('museum_name')
+
+def _off_days(museum):
+    return [d.strip().capitalize() for d in (museum.get('weekly_off_days') or []) if d and d.strip()]
 
-    generator = get_generator()
-    if generator is None:
-        return "I'm currently downloading my brain updates (Model Loading) or the AI is unavailable. Please try again in a minute!"
+def _answer_hours(museum, normalized):
+    if not museum.get('opening_time') or not museum.get('closing_time'):
+        return f"I don't have opening hours for {_label(museum)}; please check with the museum before visiting."
+    off = _off_days(museum)
+    closed = f", closed on {', '.join(off)}" if off else ", all week"
+    return f"{_label(museum)} is open {museum['opening_time']} to {museum['closing_time']}{closed}."
 
+def _answer_off_days(museum, normalized):
+    off = _off_days(museum)
+    asked = [d for d in WEEKDAYS if re.search(rf"\b{d}\b", normalized)]
+    if 'weekend' in normalized:
+        asked += ['saturday', 'sunday']
+    hours = (f" ({museum['opening_time']} to {museum['closing_time']})"
+             if museum.get('opening_time') and museum.get('closing_time') else '')
+    if asked:
+        closed = [d.capitalize() for d in asked if d.capitalize() in off]
+        open_days = [d.capitalize() for d in asked if d.capitalize() not in off]
+        parts = []
+        if open_days:
+            parts.append(f"{_label(museum)} is open on {', '.join(open_days)}{hours}.")
+        if closed:
+            parts.append(f"{_label(museum)} is closed on {', '.join(closed)}.")
+        return ' '.join(parts)
+    if not off:
+        return f"{_label(museum)} has no weekly off day; it is open all week{hours}."
+    return f"{_label(museum)} is closed every {', '.join(off)}."
+
+def _answer_fee(museum, normalized):
+    try:
+        fee = float(museum.get('entry_fee'))
+    except (TypeError, ValueError):
+        return f"I don't have the entry fee for {_label(museum)}; please check with the museum."
+    if fee <= 0:
+        answer = f"Entry to {_label(museum)} is free."
+    else:
+        amount = int(fee) if fee.is_integer() else fee
+        answer = f"Entry to {_label(museum)} costs {museum.get('ticket_currency') or 'INR'} {amount} per person."
+    discounts = [who for who, field in (('students', 'student_discount'), ('senior citizens', 'senior_citizen_discount'))
+                 if museum.get(field)]
+    if fee > 0 and discounts:
+        answer += f" Discounts are available for {' and '.join(discounts)}."
+    return answer + " You can book tickets on the Museums page."
+
+def _answer_location(museum, normalized):
+    place = museum.get('address') or ', '.join(p for p in (museum.get('city'), museum.get('state')) if p)
+    if not place:
+        return f"I don't have an address for {museum.get('museum_name')}."
+    answer = f"{museum.get('museum_name')} is in {place}."
+    if museum.get('google_maps_link'):
+        answer += f" Map: {museum['google_maps_link']}"
+    return answer
+
+def _answer_accessibility(museum, normalized):
+    name = _label(museum)
+    if museum.get('wheelchair_accessible') is True:
+        answer = f"{name} is wheelchair accessible."
+    elif museum.get('wheelchair_accessible') is False:
+        answer = f"{name} is not listed as wheelchair accessible."
+    else:
+        answer = f"I don't have accessibility details for {name}."
+    if museum.get('parking_available') is True:
+        answer += " Parking is available."
+    elif museum.get('parking_available') is False:
+        answer += " There is no parking on site."
+    return answer
+
+_ANSWERS = {
+    'off_days': _answer_off_days,
+    'hours': _answer_hours,
+    'fee': _answer_fee,
+    'location': _answer_location,
+    'accessibility': _answer_accessibility
+}
+
+def answer_from_catalog(query, route=None):
+    """
+    Answers hours / fee / off day / location / accessibility questions about
+    a named museum from the catalog. None when the model should answer.
+    """
+    route = route or route_query(query)
+    intents, museums = route['intents'], route['museums']
+    if not intents or not museums or route['other_words']:
+        return None
+
+    if len(museums) > 1:
+        options = '; '.join(_label(m) for m in museums[:5])
+        return f"I found more than one museum by that name: {options}. Which one do you mean?"
+
+    # 'hours' already mentions off days
+    if 'off_days' in intents and 'hours' in intents:
+        intents = [i for i in intents if i != 'hours']
+    return ' '.join(_ANSWERS[intent](museums[0], route['normalized']) for intent in intents)
+
+def _build_prompt(tokenizer, query):
     messages = [
         {
             "role": "system",
@@ -106,34 +484,144 @@ def get_chatbot_response(query, history=None):
         },
         {"role": "user", "content": query}
     ]
+    return tokenizer.apply_chat_template(messages, tokenize=False, add_generation_prompt=True)
 
-    try:
-        prompt = generator.tokenizer.apply_chat_template(messages, tokenize=False, add_generation_prompt=True)
-        
-        outputs = generator(
-            prompt,
-            max_new_tokens=200,
-            do_sample=True,
-            temperature=0.7,
-            top_k=50,
-            top_p=0.95
-        )
+def _fast_reply(query):
+    # Replies that need neither the model nor the cache; None otherwise
+    if not query:
+        return "I didn't catch that. Could you please repeat?"
+
+    # Hours, fees, off days... of a named museum, straight from the catalog
+    route = route_query(query)
+    answer = answer_from_catalog(query, route)
+    if answer is not None:
+        return answer
+
+    if not route['museums'] and not is_domain_relevant(query):
+        return "I specialize in Indian museums and history. Please ask me about museum visits, tickets, or historical artifacts!"
+    return None
+
+def _unavailable_reply():
+    # None when the model is loaded and can answer
+    if not ML_AVAILABLE:
+        return "I am currently in 'Lite Mode' due to server limits. The AI Brain is disabled, but you can still use the Booking and Museum features!"
 
-        generated_text = outputs[0]["generated_text"]
+    if get_generator() is None:
+        if _state['status'] == 'failed':
+            return "The AI is unavailable right now. Please try again in a few minutes!"
+        return "I'm warming up (loading my brain updates). Please try again in a minute!"
+    return None
 
-        # Parse logic dependent on model output format, generally works for Qwen/Chat models
-        if "<|im_start|>assistant" in generated_text:
-            response = generated_text.split("<|im_start|>assistant")[-1].strip()
-        else:
-            # Fallback for models that might just append
-            # Try to remove the prompt from the start
-            if generated_text.startswith(prompt):
-                 response = generated_text[len(prompt):].strip()
-            else:
-                 response = generated_text
+def get_chatbot_response(query, history=None):
+    """
+    Generates a response using the loaded model.
+    """
+    reply = _fast_reply(query)
+    if reply is not None:
+        return reply
 
-        return response
+    # Answers to the same or a near-identical question, from the model earlier
+    cached = response_cache.lookup(query)
+    if cached is not None:
+        return cached
 
+    reply = _unavailable_reply()
+    if reply is not None:
+        return reply
+
+    try:
+        future = _scheduler.submit(_build_prompt(_generator.tokenizer, query))
+    except Full:
+        return "I'm answering a lot of questions right now. Please try again in a moment!"
+    except Exception as e:
+        print(f"Inference Error: {e}")
+        return "I'm having trouble thinking right now. Please try again."
+
+    try:
+        answer = future.result(timeout=REQUEST_TIMEOUT_SECONDS)
+        response_cache.store(query, answer)
+        return answer
+    except FutureTimeout:
+        future.cancel()  # skipped if it hasn't started yet
+        print(f"Inference timed out after {REQUEST_TIMEOUT_SECONDS}s")
+        return "That took too long to answer. Please try again."
     except Exception as e:
         print(f"Inference Error: {e}")
         return "I'm having trouble thinking right now. Please try again."
+
+def _stream_generate(prompt, streamer, cancelled, failed):
+    class Cancelled(StoppingCriteria):
+        def __call__(self, input_ids, scores, **kwargs):
+            return torch.full((input_ids.shape[0],), cancelled.is_set(), dtype=torch.bool, device=input_ids.device)
+
+    tokenizer, model = _generator.tokenizer, _generator.model
+    inputs = tokenizer([prompt], return_tensors='pt', add_special_tokens=False).to(model.device)
+    try:
+        with torch.no_grad():
+            model.generate(
+                **inputs,
+                streamer=streamer,
+                stopping_criteria=StoppingCriteriaList([Cancelled()]),
+                max_new_tokens=MAX_NEW_TOKENS,
+                do_sample=True,
+                temperature=0.7,
+                top_k=50,
+                top_p=0.95,
+                pad_token_id=tokenizer.pad_token_id
+            )
+    except Exception as e:
+        print(f"Streaming Inference Error: {e}")
+        failed.set()
+        streamer.end()
+    finally:
+        _stream_slots.release()
+
+def stream_chatbot_response(query):
+    """
+    Yields the answer in pieces as the model produces them.
+    Closing the generator (the client went away) stops the generation
+    after its current token.
+    """
+    reply = _fast_reply(query)
+    if reply is None:
+        reply = response_cache.lookup(query)
+    if reply is None:
+        reply = _unavailable_reply()
+    if reply is not None:
+        yield reply
+        return
+
+    if not _stream_slots.acquire(blocking=False):
+        yield "I'm answering a lot of questions right now. Please try again in a moment!"
+        return
+
+    cancelled, failed = threading.Event(), threading.Event()
+    try:
+        prompt = _build_prompt(_generator.tokenizer, query)
+        streamer = TextIteratorStreamer(_generator.tokenizer, skip_prompt=True,
+                                       skip_special_tokens=True, timeout=REQUEST_TIMEOUT_SECONDS)
+        threading.Thread(target=_stream_generate, args=(prompt, streamer, cancelled, failed),
+                         name='chatbot-stream', daemon=True).start()
+    except Exception as e:
+        _stream_slots.release()
+        print(f"Streaming Inference Error: {e}")
+        yield "I'm having trouble thinking right now. Please try again."
+        return
+
+    pieces = []
+    try:
+        for text in streamer:
+            if text:
+                pieces.append(text)
+                yield text
+        if pieces and not failed.is_set():
+            # Only answers streamed to the end are cached
+            response_cache.store(query, ''.join(pieces).strip())
+        elif not pieces:
+            yield "I'm having trouble thinking right now. Please try again."
+    except Empty:
+        print(f"Streaming inference stalled for {REQUEST_TIMEOUT_SECONDS}s")
+        yield " (That took too long to answer. Please try again.)"
+    finally:
+        # Normal end, timeout, or GeneratorExit when the client disconnects
+        cancelled.set()
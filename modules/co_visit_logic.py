@@ -0,0 +1,154 @@
+from db import get_db
+from modules import catalog_cache
+import datetime
+import math
+import os
+import threading
+import time
+
+# Item-to-item collaborative filtering: "visitors who booked X also visited".
+# Every user contributes the set of museums they booked or wishlisted; two
+# museums co-occur once per user who has both. Kept in memory as sparse rows:
+#   _pairs[a][b] = number of users with both a and b
+#   _counts[a]   = number of users with a
+# Similarity is cosine over those binary user vectors:
+#   co(a, b) / sqrt(count(a) * count(b))
+# A booking made in this process updates the rows immediately
+# (record_interaction). Bookings taken by other workers are folded in every
+# SYNC_SECONDS. A full rebuild every REBUILD_SECONDS also picks up wishlist
+# changes made elsewhere.
+
+SYNC_SECONDS = float(os.getenv('CO_VISIT_SYNC_SECONDS', 60))
+REBUILD_SECONDS = float(os.getenv('CO_VISIT_REBUILD_SECONDS', 3600))
+# Ignore pairs seen for fewer users than this
+MIN_CO_VISITS = 1
+
+_lock = threading.Lock()
+_state = {'user_items': {}, 'counts': {}, 'pairs': {},
+          'built_at': 0.0, 'synced_at': 0.0, 'watermark': None, 'refreshing': False}
+
+def _add(user_items, counts, pairs, user_id, museum_id):
+    # Caller holds _lock (or owns the structures). Idempotent per user/museum.
+    items = user_items.setdefault(user_id, set())
+    if museum_id in items:
+        return False
+    counts[museum_id] = counts.get(museum_id, 0) + 1
+    row = pairs.setdefault(museum_id, {})
+    for other in items:
+        row[other] = row.get(other, 0) + 1
+        other_row = pairs.setdefault(other, {})
+        other_row[museum_id] = other_row.get(museum_id, 0) + 1
+    items.add(museum_id)
+    return True
+
+def build_co_visits():
+    """
+    Rebuilds the co-occurrence rows from all bookings and wishlists.
+    """
+    db = get_db()
+    started = datetime.datetime.now()
+    user_items, counts, pairs = {}, {}, {}
+
+    rows = db.bookings.aggregate([
+        {'$group': {'_id': '$user_id', 'museums': {'$addToSet': '$museum_id'}}}
+    ], allowDiskUse=True)
+    for row in rows:
+        for museum_id in row['museums']:
+            if row['_id'] and museum_id:
+                _add(user_items, counts, pairs, str(row['_id']), str(museum_id))
+
+    for user in db.users.find({'wishlist.0': {'$exists': True}}, {'wishlist': 1}):
+        for museum_id in user['wishlist']:
+            _add(user_items, counts, pairs, str(user['_id']), str(museum_id))
+
+    now = time.time()
+    with _lock:
+        _state.update(user_items=user_items, counts=counts, pairs=pairs,
+                      built_at=now, synced_at=now, watermark=started)
+    return len(counts)
+
+def _sync():
+    # Folds in bookings made since the last build/sync (any worker)
+    db = get_db()
+    started = datetime.datetime.now()
+    since = _state['watermark']
+    query = {'booking_date': {'$gte': since}} if since else {}
+    new = list(db.bookings.find(query, {'user_id': 1, 'museum_id': 1}))
+    with _lock:
+        for booking in new:
+            if booking.get('user_id') and booking.get('museum_id'):
+                _add(_state['user_items'], _state['counts'], _state['pairs'],
+                     str(booking['user_id']), str(booking['museum_id']))
+        _state['synced_at'] = time.time()
+        _state['watermark'] = started
+
+def _refresh(full):
+    try:
+        if full:
+            build_co_visits()
+        else:
+            _sync()
+    except Exception as e:
+        print(f"Co-visit refresh failed: {e}")
+    finally:
+        with _lock:
+            _state['refreshing'] = False
+
+def _ensure_fresh():
+    now = time.time()
+    with _lock:
+        if _state['refreshing']:
+            return
+        first = _state['built_at'] == 0.0
+        full = first or now - _state['built_at'] >= REBUILD_SECONDS
+        if not full and now - _state['synced_at'] < SYNC_SECONDS:
+            return
+        _state['refreshing'] = True
+
+    if first:
+        _refresh(True)
+    else:
+        threading.Thread(target=_refresh, args=(full,), name='co-visit-refresh', daemon=True).start()
+
+def record_interaction(user_id, museum_id):
+    """
+    Counts a new booking or wishlist add without waiting for the next sync.
+    """
+    with _lock:
+        _add(_state['user_items'], _state['counts'], _state['pairs'], str(user_id), str(museum_id))
+
+def also_visited_ids(museum_id, limit=4, exclude=()):
+    """
+    [(museum_id, similarity)] for museums most often booked/saved by the
+    same visitors as museum_id, best first.
+    """
+    _ensure_fresh()
+    museum_id = str(museum_id)
+    skip = {museum_id} | {str(m) for m in exclude}
+    with _lock:
+        count = _state['counts'].get(museum_id)
+        row = dict(_state['pairs'].get(museum_id, {}))
+        counts = {other: _state['counts'].get(other, 0) for other in row}
+    if not count:
+        return []
+
+    scored = [
+        (other, co / math.sqrt(count * counts[other]))
+        for other, co in row.items()
+        if co >= MIN_CO_VISITS and counts[other] and other not in skip
+    ]
+    scored.sort(key=lambda item: (-item[1], item[0]))
+    return scored[:limit]
+
+def also_visited(museum_id, limit=4, exclude=()):
+    """
+    Museum documents for also_visited_ids, skipping museums no longer in the catalog.
+    """
+    results = []
+    for other, _ in also_visited_ids(museum_id, limit + 5, exclude):
+        museum = catalog_cache.get_museum(other)
+        if museum:
+            results.append(museum)
+            if len(results) == limit:
+                break
+    return results
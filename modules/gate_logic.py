@@ -0,0 +1,153 @@
+from db import get_db
+from pymongo.errors import BulkWriteError
+from utils.ticket_signing import verify_ticket, InvalidTicket
+import datetime
+import os
+import threading
+import time
+
+# Gate scans are decided in memory: the QR signature proves the ticket is
+# genuine (utils/ticket_signing) and a local used-ticket set catches double
+# entry. Each process pushes its new scans to db.gate_scans and pulls scans
+# made by other processes every GATE_SYNC_SECONDS, so lanes stay in step
+# without a database round trip per scan, and keep admitting if Mongo is
+# unreachable.
+#   gate_scans: {_id: '<booking_id>.<museum_id>.<tour_date>', booking_id,
+#                museum_id, tour_date, tickets, lane, scanned_at}
+# A scan is keyed on the ticket's signed booking, museum and date together;
+# the short booking id alone could collide between two tickets.
+# Tickets are only valid on their tour date, so only scans for yesterday,
+# today and tomorrow are kept in memory.
+
+SYNC_INTERVAL_SECONDS = float(os.getenv('GATE_SYNC_SECONDS', 5))
+# Pull a little further back than the last sync to allow for clock skew
+SYNC_OVERLAP_SECONDS = 30
+
+_lock = threading.Lock()
+_used = {}     # tour_date -> set of ticket keys
+_pending = []  # scans not yet written to Mongo
+_state = {'last_pull': None, 'thread': None}
+# Set once scans recorded before this process started are loaded (or the
+# load failed); no scan is decided before then
+_loaded = threading.Event()
+
+def _window(today):
+    return {(today + datetime.timedelta(days=d)).isoformat() for d in (-1, 0, 1)}
+
+def _ticket_key(booking_id, museum_id, tour_date):
+    return f"{booking_id}.{museum_id}.{tour_date}"
+
+def _remember(key, tour_date):
+    _used.setdefault(tour_date, set()).add(key)
+
+def _prune(today):
+    keep = _window(today)
+    for tour_date in [d for d in _used if d not in keep]:
+        del _used[tour_date]
+
+def _pull(db, since):
+    query = {'tour_date': {'$in': sorted(_window(datetime.date.today()))}}
+    if since:
+        query['scanned_at'] = {'$gt': since - datetime.timedelta(seconds=SYNC_OVERLAP_SECONDS)}
+    started = datetime.datetime.utcnow()
+    scans = list(db.gate_scans.find(query, {'booking_id': 1, 'museum_id': 1, 'tour_date': 1}))
+    with _lock:
+        for scan in scans:
+            # Scans recorded before keys included the museum have _id = booking id
+            key = _ticket_key(scan.get('booking_id', scan['_id']), scan.get('museum_id'), scan['tour_date'])
+            _remember(key, scan['tour_date'])
+    return started
+
+def _push(db):
+    with _lock:
+        batch = _pending[:]
+        del _pending[:]
+    if not batch:
+        return
+    try:
+        db.gate_scans.insert_many(batch, ordered=False)
+    except BulkWriteError as e:
+        for err in e.details.get('writeErrors', []):
+            if err.get('code') == 11000:
+                # Admitted here and at another lane between syncs
+                print(f"Gate: ticket {batch[err['index']]['_id']} was also scanned by another lane")
+            else:
+                print(f"Gate: failed to record scan {batch[err['index']]['_id']}: {err.get('errmsg')}")
+    except Exception:
+        with _lock:
+            _pending[:0] = batch  # keep for the next sync
+        raise
+
+def sync_used_tickets():
+    """
+    Writes this process's new scans to Mongo and loads scans made elsewhere.
+    """
+    db = get_db()
+    _push(db)
+    _state['last_pull'] = _pull(db, _state['last_pull'])
+    with _lock:
+        _prune(datetime.date.today())
+
+def _sync_loop():
+    while True:
+        time.sleep(SYNC_INTERVAL_SECONDS)
+        try:
+            sync_used_tickets()
+        except Exception as e:
+            print(f"Gate sync failed: {e}")
+
+def _ensure_started():
+    if _loaded.is_set():
+        return
+    with _lock:
+        first = _state['thread'] is None
+        if first:
+            _state['thread'] = threading.Thread(target=_sync_loop, name='gate-sync', daemon=True)
+    if not first:
+        # Another scan is loading; admitting before it finishes could let
+        # in a ticket already used at another gate
+        _loaded.wait()
+        return
+    # Load scans recorded before this process started, once
+    try:
+        sync_used_tickets()
+    except Exception as e:
+        print(f"Gate: could not load used tickets, verifying offline: {e}")
+    finally:
+        _loaded.set()
+    _state['thread'].start()
+
+def verify_scan(payload, museum_id=None, lane=None, today=None):
+    """
+    Decides one gate scan without touching the database.
+    Returns {'valid': bool, 'reason': str, 'ticket': dict or None}; reason is
+    ok, malformed, bad_signature, wrong_museum, wrong_date or already_used.
+    """
+    _ensure_started()
+    try:
+        ticket = verify_ticket(payload)
+    except InvalidTicket as e:
+        return {'valid': False, 'reason': str(e), 'ticket': None}
+
+    today = today or datetime.date.today()
+    if museum_id and ticket['museum_id'] != str(museum_id):
+        return {'valid': False, 'reason': 'wrong_museum', 'ticket': ticket}
+    if ticket['date'] != today.isoformat():
+        return {'valid': False, 'reason': 'wrong_date', 'ticket': ticket}
+
+    key = _ticket_key(ticket['booking_id'], ticket['museum_id'], ticket['date'])
+    with _lock:
+        used = _used.setdefault(ticket['date'], set())
+        if key in used:
+            return {'valid': False, 'reason': 'already_used', 'ticket': ticket}
+        used.add(key)
+        _pending.append({
+            '_id': key,
+            'booking_id': ticket['booking_id'],
+            'museum_id': ticket['museum_id'],
+            'tour_date': ticket['date'],
+            'tickets': ticket['tickets'],
+            'lane': lane,
+            'scanned_at': datetime.datetime.utcnow()
+        })
+    return {'valid': True, 'reason': 'ok', 'ticket': ticket}
@@ -0,0 +1,114 @@
+from db import get_db
+from modules import catalog_cache
+import heapq
+import math
+
+EARTH_RADIUS_KM = 6371.0088
+
+def geo_point(lat, lng):
+    """
+    GeoJSON Point for the museums.location field (2dsphere indexed).
+    Returns None when either coordinate is missing.
+    """
+    if lat is None or lng is None:
+        return None
+    return {'type': 'Point', 'coordinates': [float(lng), float(lat)]}
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp = p2 - p1
+    dl = math.radians(lng2 - lng1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+def _to_xyz(lat, lng):
+    # Points on the unit sphere: straight-line distance grows with great-circle
+    # distance, so a plain 3-D KD-tree gives correct nearest neighbours.
+    la, ln = math.radians(lat), math.radians(lng)
+    return (math.cos(la) * math.cos(ln), math.cos(la) * math.sin(ln), math.sin(la))
+
+class KDTree:
+    """
+    Minimal static 3-D KD-tree with k-nearest-neighbour search.
+    Nodes are stored as tuples (point, payload, axis, left, right).
+    """
+
+    def __init__(self, items):
+        # items: list of ((x, y, z), payload)
+        self.root = self._build(list(items), 0)
+
+    def _build(self, items, depth):
+        if not items:
+            return None
+        axis = depth % 3
+        items.sort(key=lambda item: item[0][axis])
+        mid = len(items) // 2
+        point, payload = items[mid]
+        return (point, payload, axis,
+                self._build(items[:mid], depth + 1),
+                self._build(items[mid + 1:], depth + 1))
+
+    def nearest(self, point, k):
+        """
+        Returns up to k (squared_distance, payload) pairs, closest first.
+        """
+        heap = []  # max-heap on distance via negation
+
+        def visit(node):
+            if node is None:
+                return
+            p, payload, axis, left, right = node
+            d = (p[0] - point[0]) ** 2 + (p[1] - point[1]) ** 2 + (p[2] - point[2]) ** 2
+            if len(heap) < k:
+                heapq.heappush(heap, (-d, id(payload), payload))
+            elif d < -heap[0][0]:
+                heapq.heapreplace(heap, (-d, id(payload), payload))
+
+            diff = point[axis] - p[axis]
+            near, far = (left, right) if diff < 0 else (right, left)
+            visit(near)
+            if len(heap) < k or diff * diff < -heap[0][0]:
+                visit(far)
+
+        visit(self.root)
+        # Order on (distance, tiebreak) only: payloads are dicts and can't be compared
+        return [(-d, payload) for d, _, payload in sorted(heap, reverse=True)]
+
+def _build_tree():
+    items = []
+    for m in catalog_cache.get_catalog():
+        lat, lng = m.get('latitude'), m.get('longitude')
+        if lat and lng:
+            items.append((_to_xyz(lat, lng), m))
+    return KDTree(items)
+
+def _nearest_from_db(lat, lng, k):
+    # $geoNear over the 2dsphere index on museums.location
+    pipeline = [
+        {'$geoNear': {
+            'near': geo_point(lat, lng),
+            'distanceField': 'distance',
+            'spherical': True
+        }},
+        {'$limit': k}
+    ]
+    results = list(get_db().museums.aggregate(pipeline))
+    for m in results:
+        m['distance_km'] = m.pop('distance') / 1000.0
+    return results
+
+def find_nearest_museums(lat, lng, k=5):
+    """
+    Returns the k museums closest to (lat, lng), each with 'distance_km'.
+    Served from a KD-tree over the cached catalog (rebuilt once per catalog
+    generation); falls back to $geoNear on the database if that fails.
+    """
+    try:
+        tree = catalog_cache.per_generation(('kdtree',), _build_tree)
+        results = []
+        for _, m in tree.nearest(_to_xyz(lat, lng), k):
+            results.append(dict(m, distance_km=haversine_km(lat, lng, m['latitude'], m['longitude'])))
+        return results
+    except Exception as e:
+        print(f"KD-tree lookup failed, using $geoNear: {e}")
+        return _nearest_from_db(lat, lng, k)
@@ -0,0 +1,153 @@
+from db import get_db
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from modules.availability_logic import invalidate_availability
+import datetime
+import os
+import uuid
+
+# One document per museum per tour date:
+#   {_id: '<museum_id>:<YYYY-MM-DD>', museum_id, tour_date,
+#    confirmed: paid/booked tickets,
+#    reserved: confirmed + tickets held by pending payments,
+#    holds: [{hold_id, tickets, expires_at}]}
+# Capacity checks are a single conditional $inc on 'reserved', so two buyers
+# can never both take the last tickets.
+
+DEFAULT_CAPACITY = 1000
+
+# How long tickets stay held while the visitor is on the payment page
+HOLD_TTL_SECONDS = int(os.getenv('INVENTORY_HOLD_SECONDS', 600))
+
+def _key(museum_id, tour_date):
+    return f"{museum_id}:{tour_date}"
+
+def _try_reserve(db, museum_id, tour_date, tickets, capacity, hold):
+    try:
+        return db.inventory.find_one_and_update(
+            {'_id': _key(museum_id, tour_date), 'reserved': {'$lte': capacity - tickets}},
+            {
+                '$inc': {'reserved': tickets},
+                '$push': {'holds': hold},
+                '$setOnInsert': {'museum_id': museum_id, 'tour_date': tour_date, 'confirmed': 0}
+            },
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+    except DuplicateKeyError:
+        # Document exists but is full; the upsert tried to create a second one
+        return None
+
+def release_expired_holds(museum_id, tour_date, db=None):
+    """
+    Drops expired holds for one museum/date and recomputes 'reserved' in a
+    single atomic pipeline update. Returns the updated document.
+    """
+    db = db if db is not None else get_db()
+    now = datetime.datetime.utcnow()
+    invalidate_availability(museum_id, tour_date)
+    return db.inventory.find_one_and_update(
+        {'_id': _key(museum_id, tour_date)},
+        [
+            {'$set': {'holds': {'$filter': {
+                'input': {'$ifNull': ['$holds', []]},
+                'cond': {'$gt': ['$$this.expires_at', now]}
+            }}}},
+            {'$set': {'reserved': {'$add': [{'$ifNull': ['$confirmed', 0]}, {'$sum': '$holds.tickets'}]}}}
+        ],
+        return_document=ReturnDocument.AFTER
+    )
+
+def reserve_tickets(museum_id, tour_date, tickets, capacity=None):
+    """
+    Holds tickets for a pending payment.
+    Returns (hold_id, remaining); hold_id is None when the date is full, in
+    which case remaining is how many tickets are still available.
+    """
+    db = get_db()
+    capacity = capacity or DEFAULT_CAPACITY
+    if tickets > capacity:
+        # The conditional $inc only guards existing documents; on a fresh
+        # date the upsert would insert any amount
+        return None, capacity
+
+    hold = {
+        'hold_id': uuid.uuid4().hex,
+        'tickets': tickets,
+        'expires_at': datetime.datetime.utcnow() + datetime.timedelta(seconds=HOLD_TTL_SECONDS)
+    }
+
+    doc = _try_reserve(db, museum_id, tour_date, tickets, capacity, hold)
+    if doc is None:
+        # Full on paper; abandoned checkouts may be holding seats
+        release_expired_holds(museum_id, tour_date, db)
+        doc = _try_reserve(db, museum_id, tour_date, tickets, capacity, hold)
+
+    if doc is None:
+        current = db.inventory.find_one({'_id': _key(museum_id, tour_date)}, {'reserved': 1})
+        reserved = current.get('reserved', 0) if current else 0
+        return None, max(capacity - reserved, 0)
+
+    invalidate_availability(museum_id, tour_date)
+    return hold['hold_id'], max(capacity - doc['reserved'], 0)
+
+def confirm_hold(museum_id, tour_date, hold_id, tickets, capacity=None):
+    """
+    Turns a hold into confirmed tickets. If the hold already expired the
+    tickets are re-reserved, which only succeeds if there is still room.
+    Returns True when the booking may go ahead.
+    """
+    db = get_db()
+
+    def convert(hold_id):
+        result = db.inventory.update_one(
+            {'_id': _key(museum_id, tour_date), 'holds.hold_id': hold_id},
+            {'$pull': {'holds': {'hold_id': hold_id}}, '$inc': {'confirmed': tickets}}
+        )
+        return result.modified_count == 1
+
+    if hold_id and convert(hold_id):
+        return True
+
+    new_hold_id, _ = reserve_tickets(museum_id, tour_date, tickets, capacity)
+    return bool(new_hold_id) and convert(new_hold_id)
+
+def release_tickets(museum_id, tour_date, tickets):
+    """
+    Gives back confirmed tickets, e.g. when the booking insert fails after
+    confirm_hold succeeded.
+    """
+    get_db().inventory.update_one(
+        {'_id': _key(museum_id, tour_date)},
+        {'$inc': {'confirmed': -tickets, 'reserved': -tickets}}
+    )
+    invalidate_availability(museum_id, tour_date)
+
+def rebuild_inventory(db=None):
+    """
+    Recomputes confirmed counts from the bookings collection, e.g. after
+    introducing inventory on a database with existing bookings.
+    Returns the number of museum/date documents written.
+    """
+    db = db if db is not None else get_db()
+    pipeline = [
+        {'$group': {
+            '_id': {'museum_id': '$museum_id', 'tour_date': '$tour_date'},
+            'tickets': {'$sum': '$tickets'}
+        }}
+    ]
+    written = 0
+    for row in db.bookings.aggregate(pipeline, allowDiskUse=True):
+        museum_id, tour_date = row['_id']['museum_id'], row['_id']['tour_date']
+        if not museum_id or not tour_date:
+            continue
+        db.inventory.update_one(
+            {'_id': _key(museum_id, tour_date)},
+            {
+                '$set': {'museum_id': museum_id, 'tour_date': tour_date,
+                         'confirmed': row['tickets'], 'reserved': row['tickets'], 'holds': []}
+            },
+            upsert=True
+        )
+        written += 1
+    return written
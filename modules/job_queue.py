@@ -0,0 +1,193 @@
+from db import get_db
+from pymongo import ReturnDocument
+import datetime
+import os
+import threading
+import time
+import traceback
+
+# Durable background jobs stored in db.jobs:
+#   {type, payload, status: queued|running|done|dead, attempts, max_attempts,
+#    run_at, locked_until, last_error, created_at, updated_at}
+# Any number of workers (threads in each app process, or scripts/run_worker.py)
+# claim jobs with an atomic find_one_and_update. A claim is a lease: if a
+# worker dies mid-job the lease runs out and another worker picks it up;
+# while a handler is still running its lease is renewed every
+# LEASE_SECONDS / 3, so a slow job is never run twice at once.
+# Jobs that keep failing are retried with exponential backoff and finally
+# copied to db.dead_letters.
+
+DEFAULT_MAX_ATTEMPTS = 5
+BACKOFF_BASE_SECONDS = 5
+BACKOFF_MAX_SECONDS = 600
+LEASE_SECONDS = 120
+POLL_INTERVAL_SECONDS = float(os.getenv('JOB_POLL_SECONDS', 1))
+
+def _now():
+    return datetime.datetime.now(datetime.timezone.utc)
+
+_handlers = {}
+_dead_handlers = {}
+_started = False
+_start_lock = threading.Lock()
+
+def job_handler(job_type):
+    """
+    Decorator registering fn(payload) as the handler for job_type.
+    A handler signals failure by raising.
+    """
+    def register(fn):
+        _handlers[job_type] = fn
+        return fn
+    return register
+
+def on_dead_letter(job_type):
+    """
+    Decorator registering fn(payload), called once a job_type job has used
+    up its attempts and been dead-lettered.
+    """
+    def register(fn):
+        _dead_handlers[job_type] = fn
+        return fn
+    return register
+
+def enqueue(job_type, payload, max_attempts=DEFAULT_MAX_ATTEMPTS, delay_seconds=0):
+    """
+    Adds a job to the queue and returns its id.
+    """
+    now = _now()
+    result = get_db().jobs.insert_one({
+        'type': job_type,
+        'payload': payload,
+        'status': 'queued',
+        'attempts': 0,
+        'max_attempts': max_attempts,
+        'run_at': now + datetime.timedelta(seconds=delay_seconds),
+        'locked_until': None,
+        'last_error': None,
+        'created_at': now,
+        'updated_at': now
+    })
+    return result.inserted_id
+
+def _claim(db):
+    now = _now()
+    return db.jobs.find_one_and_update(
+        {'$or': [
+            {'status': 'queued', 'run_at': {'$lte': now}},
+            {'status': 'running', 'locked_until': {'$lt': now}}  # abandoned lease
+        ]},
+        {
+            '$set': {'status': 'running', 'locked_until': now + datetime.timedelta(seconds=LEASE_SECONDS), 'updated_at': now},
+            '$inc': {'attempts': 1}
+        },
+        sort=[('run_at', 1)],
+        return_document=ReturnDocument.AFTER
+    )
+
+def _renew_lease(db, claim, stop_event):
+    # Runs beside a handler until it returns
+    while not stop_event.wait(LEASE_SECONDS / 3):
+        try:
+            renewed = db.jobs.update_one(claim, {'$set': {
+                'locked_until': _now() + datetime.timedelta(seconds=LEASE_SECONDS), 'updated_at': _now()
+            }})
+            if not renewed.matched_count:
+                print(f"Job {claim['_id']}: lease lost, another worker may run it")
+                return
+        except Exception as e:
+            print(f"Job {claim['_id']}: could not renew lease: {e}")
+
+def _backoff(attempts):
+    return min(BACKOFF_BASE_SECONDS * (2 ** (attempts - 1)), BACKOFF_MAX_SECONDS)
+
+def process_next():
+    """
+    Claims and runs one due job. Returns False when the queue had nothing due.
+    """
+    db = get_db()
+    job = _claim(db)
+    if not job:
+        return False
+
+    handler = _handlers.get(job['type'])
+    # Later updates only apply while this claim still holds the job
+    claim = {'_id': job['_id'], 'status': 'running', 'attempts': job['attempts']}
+    stop_renewing = threading.Event()
+    renewer = threading.Thread(target=_renew_lease, args=(db, claim, stop_renewing),
+                               name=f"job-lease-{job['_id']}", daemon=True)
+    renewer.start()
+    try:
+        if handler is None:
+            raise LookupError(f"No handler registered for job type '{job['type']}'")
+        handler(job['payload'])
+        db.jobs.update_one(claim, {'$set': {
+            'status': 'done', 'locked_until': None, 'updated_at': _now()
+        }})
+        return True
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+        trace = traceback.format_exc()
+        print(f"Job {job['_id']} ({job['type']}) failed, attempt {job['attempts']}: {error}")
+    finally:
+        stop_renewing.set()
+
+    now = _now()
+
+    if job['attempts'] >= job.get('max_attempts', DEFAULT_MAX_ATTEMPTS):
+        dead = db.jobs.update_one(claim, {'$set': {
+            'status': 'dead', 'locked_until': None, 'last_error': error, 'updated_at': now
+        }})
+        if not dead.matched_count:
+            return True  # lease lost; the job is another worker's now
+        db.dead_letters.insert_one({
+            'job_id': job['_id'],
+            'type': job['type'],
+            'payload': job['payload'],
+            'attempts': job['attempts'],
+            'error': error,
+            'traceback': trace,
+            'created_at': now
+        })
+        on_dead = _dead_handlers.get(job['type'])
+        if on_dead:
+            try:
+                on_dead(job['payload'])
+            except Exception as e:
+                print(f"Dead-letter hook for job {job['_id']} failed: {e}")
+    else:
+        db.jobs.update_one(claim, {'$set': {
+            'status': 'queued',
+            'locked_until': None,
+            'last_error': error,
+            'run_at': now + datetime.timedelta(seconds=_backoff(job['attempts'])),
+            'updated_at': now
+        }})
+    return True
+
+def run_worker(app, stop_event=None):
+    """
+    Processes jobs until stop_event is set, sleeping while the queue is idle.
+    Runs inside the app context so handlers can use Flask-Mail etc.
+    """
+    with app.app_context():
+        while not (stop_event and stop_event.is_set()):
+            try:
+                if not process_next():
+                    time.sleep(POLL_INTERVAL_SECONDS)
+            except Exception as e:
+                print(f"Job worker error: {e}")
+                time.sleep(POLL_INTERVAL_SECONDS)
+
+def start_workers(app, threads=1):
+    """
+    Starts background worker threads for this process (once).
+    """
+    global _started
+    with _start_lock:
+        if _started or threads <= 0:
+            return
+        _started = True
+    for i in range(threads):
+        t = threading.Thread(target=run_worker, args=(app,), name=f"job-worker-{i}", daemon=True)
+        t.start()
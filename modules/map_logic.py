@@ -0,0 +1,108 @@
+from db import get_db
+from modules import catalog_cache
+import math
+
+# Only what the map popups need
+MAP_PROJECTION = {
+    'museum_name': 1,
+    'museum_type': 1,
+    'city': 1,
+    'state': 1,
+    'latitude': 1,
+    'longitude': 1
+}
+
+def _load_points():
+    db = get_db()
+    museums = db.museums.find(
+        {'latitude': {'$ne': None}, 'longitude': {'$ne': None}},
+        MAP_PROJECTION
+    )
+    return [m for m in museums if m.get('latitude') and m.get('longitude')]
+
+def get_map_points():
+    """
+    Museums that have coordinates, with only the map fields. Loaded once per
+    catalog generation; the cluster index is built from them.
+    """
+    return catalog_cache.per_generation(('map_points',), _load_points)
+
+# --- Viewport clustering ---
+# Each zoom level gets a regular lat/lng grid with GRID_PER_TILE cells per
+# 256px map tile (~64px cells). Points are pre-bucketed for every zoom up to
+# MAX_CLUSTER_ZOOM; beyond that every museum is returned individually.
+GRID_PER_TILE = 4
+MAX_CLUSTER_ZOOM = 14
+
+def _cell_size(zoom):
+    return 360.0 / ((2 ** zoom) * GRID_PER_TILE)
+
+def _build_cluster_index():
+    points = get_map_points()
+    levels = []
+    for zoom in range(MAX_CLUSTER_ZOOM + 1):
+        size = _cell_size(zoom)
+        cells = {}
+        for i, m in enumerate(points):
+            key = (int(math.floor(m['longitude'] / size)), int(math.floor(m['latitude'] / size)))
+            cell = cells.get(key)
+            if cell is None:
+                cell = cells[key] = {'count': 0, 'lat': 0.0, 'lng': 0.0, 'members': []}
+            cell['count'] += 1
+            cell['lat'] += m['latitude']
+            cell['lng'] += m['longitude']
+            cell['members'].append(i)
+        for cell in cells.values():
+            cell['lat'] /= cell['count']
+            cell['lng'] /= cell['count']
+        levels.append(cells)
+    return {'points': points, 'levels': levels}
+
+def _point_payload(m):
+    return {
+        'id': str(m['_id']),
+        'museum_name': m.get('museum_name'),
+        'museum_type': m.get('museum_type'),
+        'city': m.get('city'),
+        'state': m.get('state', ''),
+        'lat': m['latitude'],
+        'lng': m['longitude']
+    }
+
+def get_map_clusters(bbox, zoom):
+    """
+    Returns {'clusters': [...], 'points': [...]} for the viewport bbox
+    (min_lng, min_lat, max_lng, max_lat) at the given zoom. Work and payload
+    are bounded by the number of grid cells in view, not the catalog size.
+    """
+    index = catalog_cache.per_generation(('map_clusters',), _build_cluster_index)
+    points = index['points']
+    min_lng, min_lat, max_lng, max_lat = bbox
+
+    # Past the last clustered level, use its grid only to find the points in view
+    expand = zoom > MAX_CLUSTER_ZOOM
+    grid_zoom = min(zoom, MAX_CLUSTER_ZOOM)
+    cells = index['levels'][grid_zoom]
+
+    size = _cell_size(grid_zoom)
+    x0, x1 = int(math.floor(min_lng / size)), int(math.floor(max_lng / size))
+    y0, y1 = int(math.floor(min_lat / size)), int(math.floor(max_lat / size))
+
+    # Walk whichever is smaller: the grid cells in view or the occupied cells
+    if (x1 - x0 + 1) * (y1 - y0 + 1) <= len(cells):
+        in_view = (cells[(x, y)] for x in range(x0, x1 + 1) for y in range(y0, y1 + 1) if (x, y) in cells)
+    else:
+        in_view = (cell for (x, y), cell in cells.items() if x0 <= x <= x1 and y0 <= y <= y1)
+
+    clusters = []
+    singles = []
+    for cell in in_view:
+        if expand or cell['count'] == 1:
+            for i in cell['members']:
+                m = points[i]
+                if min_lng <= m['longitude'] <= max_lng and min_lat <= m['latitude'] <= max_lat:
+                    singles.append(_point_payload(m))
+        else:
+            clusters.append({'lat': cell['lat'], 'lng': cell['lng'], 'count': cell['count']})
+
+    return {'zoom': zoom, 'clusters': clusters, 'points': singles}
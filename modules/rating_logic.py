@@ -0,0 +1,106 @@
+from db import get_db
+from modules import catalog_cache
+from bson.objectid import ObjectId
+from pymongo import ReturnDocument, UpdateOne
+import os
+import time
+
+# Rating aggregates live on the museum document so listings can sort and
+# filter by rating without touching db.reviews:
+#   rating_count, rating_sum, rating_histogram {'1'..'5': n},
+#   average_rating (0 while unrated, rounded to 2 places), total_reviews
+# record_rating keeps them current on every review write;
+# reconcile_ratings rebuilds them from db.reviews in bulk.
+# A single review does not bump the catalog generation (that would rebuild
+# every catalog-derived cache per review). Views that show ratings put
+# rating_epoch() in their cache keys instead, so they refresh at least every
+# RATING_CACHE_SECONDS.
+
+STARS = ('1', '2', '3', '4', '5')
+RATING_FIELDS = ('rating_count', 'rating_sum', 'rating_histogram', 'average_rating', 'total_reviews')
+RATING_CACHE_SECONDS = float(os.getenv('RATING_CACHE_SECONDS', 60))
+
+def rating_epoch():
+    """
+    Changes every RATING_CACHE_SECONDS; part of the cache key of anything
+    that shows rating aggregates.
+    """
+    return int(time.time() // RATING_CACHE_SECONDS)
+
+def empty_rating_fields():
+    """
+    Aggregate fields for a museum with no reviews yet.
+    """
+    return {
+        'rating_count': 0,
+        'rating_sum': 0,
+        'rating_histogram': {star: 0 for star in STARS},
+        'average_rating': 0,
+        'total_reviews': 0
+    }
+
+def record_rating(museum_id, rating, db=None):
+    """
+    Adds one review's rating (1-5) to the museum's aggregates in a single
+    atomic pipeline update, so concurrent reviews can't lose counts or
+    leave the average out of step with them.
+    """
+    db = db if db is not None else get_db()
+    star = str(int(rating))
+    if star not in STARS:
+        raise ValueError(f"Rating must be 1-5, got {rating}")
+
+    museum = db.museums.find_one_and_update({'_id': ObjectId(museum_id)}, [
+        {'$set': {
+            'rating_count': {'$add': [{'$ifNull': ['$rating_count', 0]}, 1]},
+            'rating_sum': {'$add': [{'$ifNull': ['$rating_sum', 0]}, int(star)]},
+            f'rating_histogram.{star}': {'$add': [{'$ifNull': [f'$rating_histogram.{star}', 0]}, 1]}
+        }},
+        {'$set': {
+            'total_reviews': '$rating_count',
+            'average_rating': {'$round': [{'$divide': ['$rating_sum', '$rating_count']}, 2]}
+        }}
+    ], projection={field: 1 for field in RATING_FIELDS}, return_document=ReturnDocument.AFTER)
+    if museum:
+        museum.pop('_id', None)
+        catalog_cache.patch_museum(museum_id, museum)
+
+def reconcile_ratings(db=None):
+    """
+    Recomputes every museum's rating aggregates from db.reviews, e.g. after
+    importing reviews or to repair drift. Museums without reviews are reset
+    to empty aggregates. Returns the number of museums with reviews.
+    """
+    db = db if db is not None else get_db()
+    pipeline = [
+        {'$group': {
+            '_id': {'museum_id': '$museum_id', 'rating': '$rating'},
+            'count': {'$sum': 1}
+        }}
+    ]
+    aggregates = {}
+    for row in db.reviews.aggregate(pipeline, allowDiskUse=True):
+        museum_id, rating = row['_id']['museum_id'], row['_id'].get('rating')
+        star = str(rating) if rating is not None else None
+        if not museum_id or star not in STARS:
+            continue
+        fields = aggregates.setdefault(str(museum_id), empty_rating_fields())
+        fields['rating_count'] += row['count']
+        fields['rating_sum'] += int(star) * row['count']
+        fields['rating_histogram'][star] += row['count']
+
+    ops, rated = [], []
+    for museum_id, fields in aggregates.items():
+        if not ObjectId.is_valid(museum_id):
+            print(f"Skipping reviews with invalid museum_id {museum_id}")
+            continue
+        fields['total_reviews'] = fields['rating_count']
+        fields['average_rating'] = round(fields['rating_sum'] / fields['rating_count'], 2)
+        rated.append(ObjectId(museum_id))
+        ops.append(UpdateOne({'_id': rated[-1]}, {'$set': fields}))
+
+    db.museums.update_many({'_id': {'$nin': rated}}, {'$set': empty_rating_fields()})
+    if ops:
+        db.museums.bulk_write(ops, ordered=False)
+    catalog_cache.bump_catalog_version(db)
+    return len(ops)
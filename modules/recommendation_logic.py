@@ -1,22 +1,277 @@
 from db import get_db
-import random
+from modules import catalog_cache
+from modules.job_queue import enqueue, job_handler
+from bson.objectid import ObjectId
+from pymongo.errors import DuplicateKeyError
+import numpy as np
+import datetime
+import json
+import math
+import os
+import re
+import shutil
+import tempfile
+import threading
 
-def get_recommendations(user_id=None):
+# Content-based recommendations. Every museum is embedded as a TF-IDF vector
+# over its name, type, description, city and state; the TOP_K most similar
+# museums for each one are precomputed (scripts/build_recommendations.py or
+# the 'build_recommendations' job) and saved as .npy files that requests
+# memory-map, so a recommendation is a row lookup instead of a query.
+# Each build gets its own directory under ARTIFACT_DIR:
+#   <build>/neighbors.npy: int32 [n_museums, TOP_K] row indices, most similar first
+#   <build>/scores.npy:    float32 [n_museums, TOP_K] cosine similarities
+#   <build>/meta.json:     museum ids in row order + the catalog generation built from
+#   CURRENT:               name of the build to serve, swapped atomically
+# so a reader always maps the three files of one build. When the catalog
+# changes, the first request to notice enqueues one rebuild job (claimed in
+# db.meta, so workers don't all build); the old build serves until then.
+# Requests never build: with no build yet, get_recommendations falls back to
+# a random selection.
+
+TOP_K = 20
+MAX_FEATURES = 4096
+# Museums the user booked or wishlisted that seed their recommendations
+MAX_SEEDS = 10
+# Rows of the similarity matrix computed at once (bounds memory on big catalogs)
+BLOCK_ROWS = 1024
+
+ARTIFACT_DIR = os.getenv('RECOMMENDER_DIR', os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'models', 'recommender'))
+POINTER_FILE = 'CURRENT'
+# Older builds kept next to the current one (a process may still have one mapped)
+KEEP_BUILDS = 2
+BUILD_CLAIM_ID = 'recommender_build'
+
+TEXT_FIELDS = ('museum_name', 'museum_type', 'description', 'city', 'state')
+
+_lock = threading.Lock()
+_index = {'neighbors': None, 'scores': None, 'ids': None, 'row_of': None,
+          'generation': None, 'build': None, 'mtime': None, 'requested': None}
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_STOP_WORDS = {'the', 'of', 'and', 'at', 'in', 'a', 'an', 'to', 'for', 'on', 'with',
+               'museum', 'explore', 'rich', 'history', 'culture', 'none'}
+
+def _tokens(museum):
+    text = ' '.join(str(museum.get(f) or '') for f in TEXT_FIELDS).lower()
+    return [t for t in _TOKEN_RE.findall(text) if t not in _STOP_WORDS and len(t) > 1]
+
+def _tfidf(docs):
+    # docs: list of token lists -> L2-normalized float32 [n_docs, n_terms]
+    df = {}
+    for tokens in docs:
+        for term in set(tokens):
+            df[term] = df.get(term, 0) + 1
+    vocab = sorted(df, key=lambda t: (-df[t], t))[:MAX_FEATURES]
+    column = {term: i for i, term in enumerate(vocab)}
+
+    n = len(docs)
+    matrix = np.zeros((n, len(vocab)), dtype=np.float32)
+    for row, tokens in enumerate(docs):
+        for term in tokens:
+            col = column.get(term)
+            if col is not None:
+                matrix[row, col] += 1
+    np.log1p(matrix, out=matrix)  # sublinear tf
+    idf = np.array([math.log((1 + n) / (1 + df[t])) + 1 for t in vocab], dtype=np.float32)
+    matrix *= idf
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    matrix /= norms
+    return matrix
+
+def _top_k(matrix, k):
+    n = matrix.shape[0]
+    k = min(k, max(n - 1, 0))
+    neighbors = np.zeros((n, k), dtype=np.int32)
+    scores = np.zeros((n, k), dtype=np.float32)
+    if k == 0:
+        return neighbors, scores
+
+    for start in range(0, n, BLOCK_ROWS):
+        sims = matrix[start:start + BLOCK_ROWS] @ matrix.T
+        rows = np.arange(sims.shape[0])
+        sims[rows, rows + start] = -1  # never recommend the museum itself
+        part = np.argpartition(-sims, k - 1, axis=1)[:, :k]
+        part_scores = np.take_along_axis(sims, part, axis=1)
+        order = np.argsort(-part_scores, axis=1)
+        neighbors[start:start + len(rows)] = np.take_along_axis(part, order, axis=1)
+        scores[start:start + len(rows)] = np.take_along_axis(part_scores, order, axis=1)
+    return neighbors, scores
+
+def _compute(museums, generation):
+    neighbors, scores = _top_k(_tfidf([_tokens(m) for m in museums]), TOP_K)
+    meta = {
+        'ids': [str(m['_id']) for m in museums],
+        'generation': generation,
+        'top_k': int(neighbors.shape[1]),
+        'built_at': datetime.datetime.utcnow().isoformat()
+    }
+    return neighbors, scores, meta
+
+def _write(out_dir, neighbors, scores, meta):
+    # A fresh directory per build, then one atomic swap of the pointer, so
+    # readers never see files from two different builds
+    os.makedirs(out_dir, exist_ok=True)
+    build_dir = tempfile.mkdtemp(prefix=f"build-{meta['generation']}-", dir=out_dir)
+    name = os.path.basename(build_dir)
+    np.save(os.path.join(build_dir, 'neighbors.npy'), neighbors)
+    np.save(os.path.join(build_dir, 'scores.npy'), scores)
+    with open(os.path.join(build_dir, 'meta.json'), 'w') as f:
+        json.dump(meta, f)
+
+    tmp = os.path.join(out_dir, f"{POINTER_FILE}.{os.getpid()}.tmp")
+    with open(tmp, 'w') as f:
+        f.write(name)
+    os.replace(tmp, os.path.join(out_dir, POINTER_FILE))
+
+    builds = sorted((d for d in os.listdir(out_dir) if d.startswith('build-') and d != name),
+                    key=lambda d: os.path.getmtime(os.path.join(out_dir, d)))
+    for old in builds[:max(len(builds) - (KEEP_BUILDS - 1), 0)]:
+        shutil.rmtree(os.path.join(out_dir, old), ignore_errors=True)
+
+def build_recommendation_index(out_dir=ARTIFACT_DIR):
+    """
+    Computes the top-k neighbor matrix for the current catalog and writes it
+    to out_dir as a new build. Returns the number of museums indexed.
+    """
+    generation = catalog_cache.get_catalog_generation()
+    neighbors, scores, meta = _compute(catalog_cache.get_catalog(), generation)
+    _write(out_dir, neighbors, scores, meta)
+    return len(meta['ids'])
+
+@job_handler('build_recommendations')
+def _build_job(payload):
+    count = build_recommendation_index()
+    print(f"Recommendation index rebuilt: {count} museums (generation {payload.get('generation')}).")
+
+def _request_rebuild(generation):
+    # One job per generation across all processes: the db.meta claim only
+    # succeeds for whoever moves it to this generation first
     db = get_db()
-    
-    if user_id:
-        last_booking = db.bookings.find_one(
-            {'user_id': user_id}, 
-            sort=[('booking_date', -1)]
+    try:
+        claimed = db.meta.update_one(
+            {'_id': BUILD_CLAIM_ID, 'generation': {'$ne': generation}},
+            {'$set': {'generation': generation, 'requested_at': datetime.datetime.utcnow()}},
+            upsert=True
         )
-        
-        if last_booking:
-            last_museum = db.museums.find_one({'_id': last_booking['museum_id']}) # This might need ObjectId coversion if stored as ObjectId
-            pass
+    except DuplicateKeyError:
+        return  # already claimed for this generation
+    if claimed.modified_count or claimed.upserted_id is not None:
+        enqueue('build_recommendations', {'generation': generation}, max_attempts=3)
+
+def _load_index():
+    # Caller holds _lock. Maps the current build again when another process
+    # (or the build script) has swapped the pointer.
+    pointer = os.path.join(ARTIFACT_DIR, POINTER_FILE)
+    try:
+        mtime = os.path.getmtime(pointer)
+    except OSError:
+        return
+    if mtime == _index['mtime']:
+        return
+    with open(pointer) as f:
+        name = f.read().strip()
+    if name != _index['build']:
+        build_dir = os.path.join(ARTIFACT_DIR, name)
+        with open(os.path.join(build_dir, 'meta.json')) as f:
+            meta = json.load(f)
+        _index['neighbors'] = np.load(os.path.join(build_dir, 'neighbors.npy'), mmap_mode='r')
+        _index['scores'] = np.load(os.path.join(build_dir, 'scores.npy'), mmap_mode='r')
+        _index['ids'] = meta['ids']
+        _index['row_of'] = {museum_id: row for row, museum_id in enumerate(meta['ids'])}
+        _index['generation'] = meta.get('generation')
+        _index['build'] = name
+    _index['mtime'] = mtime
+
+def _get_index():
+    generation = catalog_cache.get_catalog_generation()
+    with _lock:
+        try:
+            _load_index()
+        except Exception as e:
+            print(f"Could not load recommendation index: {e}")
+        # Ask for a rebuild once per catalog generation (per process)
+        request = _index['generation'] != generation and _index['requested'] != generation
+        if request:
+            _index['requested'] = generation
+
+    if request:
+        try:
+            _request_rebuild(generation)
+        except Exception as e:
+            print(f"Could not request a recommendation rebuild: {e}")
+
+    with _lock:
+        if _index['ids'] is None:
+            return None
+        return _index['neighbors'], _index['scores'], _index['ids'], _index['row_of']
+
+def similar_museums(museum_ids, limit=3, exclude=()):
+    """
+    Museums most similar to the given ones, best first. Similarities from
+    several seed museums are summed.
+    """
+    index = _get_index()
+    if index is None:
+        return []
+    neighbors, scores, ids, row_of = index
+
+    seed_rows = [row_of[str(m)] for m in museum_ids if str(m) in row_of]
+    if not seed_rows:
+        return []
+    skip = {str(m) for m in museum_ids} | {str(m) for m in exclude}
+
+    totals = {}
+    for row in seed_rows:
+        for neighbor, score in zip(neighbors[row], scores[row]):
+            if score > 0:
+                totals[int(neighbor)] = totals.get(int(neighbor), 0.0) + float(score)
 
-    pipeline = [{"$sample": {"size": 3}}]
+    results = []
+    for row in sorted(totals, key=totals.get, reverse=True):
+        museum = catalog_cache.get_museum(ids[row])
+        if museum and ids[row] not in skip:
+            results.append(museum)
+            if len(results) == limit:
+                break
+    return results
+
+def recommendation_seeds(recent_museum_ids, wishlist):
+    """
+    Museums that seed a user's recommendations: most recent bookings first,
+    then wishlist, up to MAX_SEEDS.
+    """
+    seeds = []
+    for museum_id in list(recent_museum_ids) + list(wishlist or []):
+        if museum_id and museum_id not in seeds:
+            seeds.append(museum_id)
+            if len(seeds) == MAX_SEEDS:
+                break
+    return seeds
+
+def get_recommendations(user_id=None, limit=3, seeds=None):
+    """
+    seeds: museum ids from recommendation_seeds, when the caller already
+    loaded the user's bookings and wishlist; otherwise they are queried.
+    """
+    db = get_db()
+
+    if user_id and seeds is None:
+        recent = db.bookings.find({'user_id': user_id}, {'museum_id': 1}).sort('booking_date', -1).limit(MAX_SEEDS)
+        user = db.users.find_one({'_id': ObjectId(user_id)}, {'wishlist': 1})
+        seeds = recommendation_seeds([b.get('museum_id') for b in recent], (user or {}).get('wishlist'))
+
+    if seeds:
+        recommendations = similar_museums(seeds, limit)
+        if recommendations:
+            return recommendations
+
+    # No history yet: a random selection, as before
+    pipeline = [{"$sample": {"size": limit}}]
     recommendations = list(db.museums.aggregate(pipeline))
-    
+
     return recommendations
 
 def logic_placeholder():
@@ -0,0 +1,210 @@
+from collections import Counter, OrderedDict
+from modules import catalog_cache
+import numpy as np
+import os
+import re
+import threading
+import time
+
+# Cache of chatbot answers in front of the model, two tiers:
+#   1. exact: the normalized question (lowercase, punctuation and extra
+#      spaces removed) -> answer
+#   2. semantic: the nearest cached question by sentence-transformers
+#      embedding (cosine >= CHATBOT_CACHE_SIMILARITY), so "Indian museum
+#      opening time" can reuse the answer to "what are the timings of
+#      Indian Museum"
+# Entries expire after CHATBOT_CACHE_TTL_SECONDS; past CHATBOT_CACHE_SIZE the
+# least recently used is evicted. Embeddings live in one preallocated
+# CHATBOT_CACHE_SIZE x dim float32 matrix (~1.5MB at the defaults).
+# A semantic match must also mention the same museum-name / city words, so a
+# question about one museum never gets another museum's answer.
+
+try:
+    from sentence_transformers import SentenceTransformer
+    EMBEDDINGS_AVAILABLE = True
+except ImportError:
+    EMBEDDINGS_AVAILABLE = False
+    print("WARNING: sentence-transformers not found. Chatbot cache will match exact questions only.")
+
+EMBED_MODEL_ID = os.getenv('CHATBOT_EMBED_MODEL', 'sentence-transformers/all-MiniLM-L6-v2')
+MAX_ENTRIES = int(os.getenv('CHATBOT_CACHE_SIZE', 1024))
+TTL_SECONDS = float(os.getenv('CHATBOT_CACHE_TTL_SECONDS', 3600))
+SIMILARITY_THRESHOLD = float(os.getenv('CHATBOT_CACHE_SIMILARITY', 0.9))
+# Name words in more than this share of museum names ('museum', 'art', ...)
+# don't identify a museum
+COMMON_TERM_SHARE = 0.02
+# Words that occur in a few museum names but mostly in questions
+QUESTION_WORDS = frozenset([
+    'the', 'and', 'for', 'with', 'from', 'about', 'near', 'what', 'where', 'when', 'which', 'how',
+    'who', 'are', 'time', 'timing', 'timings', 'open', 'opening', 'close', 'closing', 'hours',
+    'ticket', 'tickets', 'fee', 'fees', 'entry', 'price', 'cost', 'visit', 'best', 'tell', 'city'
+])
+CANDIDATES = 5
+
+_lock = threading.Lock()
+_entries = OrderedDict()  # normalized question -> {'answer', 'at', 'slot', 'terms'}
+_slots = {'vectors': None, 'keys': [None] * MAX_ENTRIES, 'free': list(range(MAX_ENTRIES))}
+_embedder = {'model': None, 'status': 'idle'}  # idle | loading | ready | failed
+_stats = {'exact_hits': 0, 'semantic_hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0, 'expired': 0}
+
+def _normalize(text):
+    return ' '.join(re.sub(r'[^a-z0-9]+', ' ', (text or '').lower()).split())
+
+def _name_terms():
+    def load():
+        museums = catalog_cache.get_catalog()
+        counts = Counter()
+        places = set()
+        for museum in museums:
+            counts.update(set(_normalize(museum.get('museum_name')).split()))
+            places.update(_normalize(f"{museum.get('city', '')} {museum.get('state', '')}").split())
+        limit = max(2, len(museums) * COMMON_TERM_SHARE)
+        names = {term for term, n in counts.items() if n <= limit}
+        return frozenset(term for term in names | places if len(term) > 2 and term not in QUESTION_WORDS)
+
+    try:
+        return catalog_cache.per_generation(('chatbot_name_terms',), load)
+    except Exception as e:
+        print(f"Chatbot cache: museum names unavailable: {e}")
+        return frozenset()
+
+def _terms(normalized):
+    return frozenset(set(normalized.split()) & _name_terms())
+
+# --- Embeddings ---
+
+def _load_embedder():
+    try:
+        started = time.time()
+        model = SentenceTransformer(EMBED_MODEL_ID, device='cpu')
+        _embedder.update(model=model, status='ready')
+        print(f"Chatbot cache embedder {EMBED_MODEL_ID} loaded in {time.time() - started:.1f}s.")
+    except Exception as e:
+        print(f"Chatbot cache: could not load {EMBED_MODEL_ID}, exact matches only. {e}")
+        _embedder['status'] = 'failed'
+
+def _embed(normalized):
+    """
+    Unit-length embedding of a normalized question, or None until the
+    embedding model has loaded (in the background, on first use).
+    """
+    if not EMBEDDINGS_AVAILABLE:
+        return None
+    if _embedder['status'] == 'idle':
+        with _lock:
+            if _embedder['status'] == 'idle':
+                _embedder['status'] = 'loading'
+                threading.Thread(target=_load_embedder, name='chatbot-cache-embedder', daemon=True).start()
+    if _embedder['status'] != 'ready':
+        return None
+    return _embedder['model'].encode(normalized, normalize_embeddings=True, convert_to_numpy=True).astype(np.float32)
+
+# --- Cache ---
+
+def _drop(key):
+    entry = _entries.pop(key)
+    if entry['slot'] is not None:
+        # A zero row scores 0, below any threshold
+        _slots['vectors'][entry['slot']] = 0
+        _slots['keys'][entry['slot']] = None
+        _slots['free'].append(entry['slot'])
+
+def _fresh(key, now):
+    entry = _entries.get(key)
+    if entry is None:
+        return None
+    if now - entry['at'] > TTL_SECONDS:
+        _drop(key)
+        _stats['expired'] += 1
+        return None
+    _entries.move_to_end(key)
+    return entry
+
+def _nearest(vector, terms, now):
+    vectors = _slots['vectors']
+    if vectors is None or vector.shape[0] != vectors.shape[1]:
+        return None
+    scores = vectors @ vector
+    top = np.argpartition(-scores, min(CANDIDATES, len(scores) - 1))[:CANDIDATES]
+    for slot in top[np.argsort(-scores[top])]:
+        if scores[slot] < SIMILARITY_THRESHOLD:
+            break
+        key = _slots['keys'][slot]
+        entry = _fresh(key, now) if key is not None else None
+        if entry is not None and entry['terms'] == terms:
+            return entry
+    return None
+
+def lookup(query):
+    """
+    Cached answer for query (exact, then semantic match), or None.
+    """
+    key = _normalize(query)
+    now = time.time()
+    with _lock:
+        entry = _fresh(key, now)
+        if entry is not None:
+            _stats['exact_hits'] += 1
+            return entry['answer']
+
+    vector = _embed(key)
+    if vector is not None:
+        terms = _terms(key)
+        with _lock:
+            entry = _nearest(vector, terms, now)
+            if entry is not None:
+                _stats['semantic_hits'] += 1
+                return entry['answer']
+
+    with _lock:
+        _stats['misses'] += 1
+    return None
+
+def store(query, answer):
+    """
+    Caches a model answer for query.
+    """
+    key = _normalize(query)
+    if not key or not answer:
+        return
+    vector = _embed(key)
+    terms = _terms(key)
+
+    with _lock:
+        if key in _entries:
+            _drop(key)
+        while len(_entries) >= MAX_ENTRIES:
+            _drop(next(iter(_entries)))
+            _stats['evictions'] += 1
+
+        slot = None
+        if vector is not None:
+            if _slots['vectors'] is None:
+                _slots['vectors'] = np.zeros((MAX_ENTRIES, vector.shape[0]), dtype=np.float32)
+            if vector.shape[0] == _slots['vectors'].shape[1]:
+                slot = _slots['free'].pop()
+                _slots['vectors'][slot] = vector
+                _slots['keys'][slot] = key
+
+        _entries[key] = {'answer': answer, 'at': time.time(), 'slot': slot, 'terms': terms}
+        _stats['stores'] += 1
+
+def clear_response_cache():
+    """
+    Drops every cached answer (counters are kept).
+    """
+    with _lock:
+        for key in list(_entries):
+            _drop(key)
+
+def cache_stats():
+    """
+    Hit/miss counters and size, for /chatbot/health.
+    """
+    with _lock:
+        stats = dict(_stats)
+        stats['entries'] = len(_entries)
+    lookups = stats['exact_hits'] + stats['semantic_hits'] + stats['misses']
+    stats['hit_rate'] = round((stats['exact_hits'] + stats['semantic_hits']) / lookups, 3) if lookups else None
+    stats['embeddings'] = _embedder['status'] if EMBEDDINGS_AVAILABLE else 'unavailable'
+    return stats
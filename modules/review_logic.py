@@ -0,0 +1,82 @@
+from db import get_db
+from modules import catalog_cache
+from modules.rating_logic import STARS, rating_epoch
+from bson.objectid import ObjectId
+from utils.pagination import keyset_paginate
+
+# Public review feed for one museum. Pages are keyset ranges on the
+# (museum_id, created_at, _id) / (museum_id, rating, created_at, _id)
+# indexes, so a museum with thousands of reviews costs the same per page as
+# one with ten.
+
+REVIEW_SORTS = {
+    'recent': [('created_at', -1), ('_id', -1)],
+    'rating': [('rating', -1), ('created_at', -1), ('_id', -1)]
+}
+MAX_PER_PAGE = 50
+
+_PROJECTION = {'rating': 1, 'comment': 1, 'created_at': 1, 'email': 1}
+
+def _reviewer(email):
+    # Reviews are public; never expose the full address
+    name = (email or '').split('@')[0]
+    return f"{name[:1]}***" if name else 'Visitor'
+
+def get_rating_summary(museum_id):
+    """
+    Average, count and 1-5 histogram for a museum. Read from the
+    materialized aggregates when present, otherwise aggregated from
+    db.reviews; cached for the current rating_epoch.
+    """
+    if not catalog_cache.get_museum(museum_id):
+        return None
+
+    def load():
+        # From the database: reviews don't refresh the cached catalog of other workers
+        museum = get_db().museums.find_one({'_id': ObjectId(museum_id)}, {'rating_histogram': 1}) or {}
+        if isinstance(museum.get('rating_histogram'), dict):
+            histogram = {star: int(museum['rating_histogram'].get(star, 0)) for star in STARS}
+        else:
+            histogram = {star: 0 for star in STARS}
+            rows = get_db().reviews.aggregate([
+                {'$match': {'museum_id': str(museum_id)}},
+                {'$group': {'_id': '$rating', 'count': {'$sum': 1}}}
+            ])
+            for row in rows:
+                if str(row['_id']) in histogram:
+                    histogram[str(row['_id'])] = row['count']
+
+        count = sum(histogram.values())
+        total = sum(int(star) * n for star, n in histogram.items())
+        return {
+            'count': count,
+            'average_rating': round(total / count, 2) if count else None,
+            'histogram': histogram
+        }
+
+    return catalog_cache.memoize(('rating_summary', str(museum_id), rating_epoch()), load)
+
+def get_review_feed(museum_id, sort='recent', after=None, before=None, per_page=10):
+    """
+    One page of a museum's reviews plus its rating summary.
+    Returns None if the museum does not exist; raises ValueError for an unknown sort.
+    """
+    if sort not in REVIEW_SORTS:
+        raise ValueError(f"sort must be one of {', '.join(REVIEW_SORTS)}")
+    summary = get_rating_summary(museum_id)
+    if summary is None:
+        return None
+
+    per_page = max(1, min(per_page, MAX_PER_PAGE))
+    docs, pagination = keyset_paginate(get_db().reviews, {'museum_id': str(museum_id)},
+                                       REVIEW_SORTS[sort], per_page, after, before, _PROJECTION)
+    reviews = [{
+        'id': str(doc['_id']),
+        'rating': doc.get('rating'),
+        'comment': doc.get('comment'),
+        'created_at': doc['created_at'].isoformat() if doc.get('created_at') else None,
+        'reviewer': _reviewer(doc.get('email'))
+    } for doc in docs]
+
+    return {'museum_id': str(museum_id), 'sort': sort, 'summary': summary,
+            'reviews': reviews, 'pagination': pagination}
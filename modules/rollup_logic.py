@@ -0,0 +1,167 @@
+from db import get_db
+from modules import catalog_cache
+from pymongo import ReplaceOne, UpdateOne
+import datetime
+
+# Daily booking rollups in db.daily_rollups, one document per day and key:
+#   {_id: '<kind>:<key>:<YYYY-MM-DD>', kind, key, day, bookings, tickets, revenue}
+# kind is 'all' (key '*', the daily total), 'museum' (key museum_id) or
+# 'payment_method' (key e.g. 'Card'). Each saved booking $inc's its three
+# documents (record_booking); backfill_rollups recomputes days from the
+# bookings collection. A year of trends is ~365 'all' documents instead of a
+# scan over every booking.
+# Revenue is the booking's 'amount' (tickets x entry_fee at checkout); older
+# bookings without one are priced at the museum's current entry_fee.
+
+KINDS = ('all', 'museum', 'payment_method')
+# Rollup documents per bulk_write / delete_many during a backfill
+WRITE_BATCH = 1000
+
+def entry_fee(museum):
+    """
+    The museum's ticket price as a number (0 when unknown or free).
+    """
+    try:
+        return float((museum or {}).get('entry_fee') or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+def _day(value):
+    if isinstance(value, datetime.datetime):
+        return value.date().isoformat()
+    return str(value)[:10]
+
+def _keys(museum_id, payment_method):
+    return (('all', '*'), ('museum', str(museum_id)), ('payment_method', payment_method or 'Unknown'))
+
+def _doc_id(kind, key, day):
+    return f"{kind}:{key}:{day}"
+
+def record_booking(booking, db=None):
+    """
+    Adds one saved booking to its day's rollups (three upserts, one round trip).
+    """
+    db = db if db is not None else get_db()
+    day = _day(booking['booking_date'])
+    tickets = int(booking.get('tickets', 0))
+    revenue = booking.get('amount')
+    if revenue is None:
+        revenue = tickets * entry_fee(catalog_cache.get_museum(booking['museum_id']))
+
+    ops = [
+        UpdateOne(
+            {'_id': _doc_id(kind, key, day)},
+            {
+                '$inc': {'bookings': 1, 'tickets': tickets, 'revenue': revenue},
+                '$setOnInsert': {'kind': kind, 'key': key, 'day': day}
+            },
+            upsert=True
+        )
+        for kind, key in _keys(booking['museum_id'], booking.get('payment_method'))
+    ]
+    db.daily_rollups.bulk_write(ops, ordered=False)
+
+def backfill_rollups(since=None, db=None):
+    """
+    Recomputes rollups from bookings, for every day from since (a date) on,
+    or the whole history. Existing rollups for those days are replaced
+    document by document (upserts), never dropped wholesale, so bookings
+    recorded while it runs are not wiped. Returns the number of rollup
+    documents written.
+    """
+    db = db if db is not None else get_db()
+    match = {'booking_date': {'$gte': datetime.datetime.combine(since, datetime.time())}} if since else {}
+
+    rows = db.bookings.aggregate([
+        {'$match': match},
+        {'$group': {
+            '_id': {
+                'day': {'$dateToString': {'format': '%Y-%m-%d', 'date': '$booking_date'}},
+                'museum_id': '$museum_id',
+                'payment_method': '$payment_method'
+            },
+            'bookings': {'$sum': 1},
+            'tickets': {'$sum': '$tickets'},
+            'amount': {'$sum': {'$ifNull': ['$amount', 0]}},
+            # Tickets on bookings saved before 'amount' existed
+            'unpriced_tickets': {'$sum': {'$cond': [
+                {'$eq': [{'$ifNull': ['$amount', 'unpriced']}, 'unpriced']}, '$tickets', 0
+            ]}}
+        }}
+    ], allowDiskUse=True)
+
+    totals = {}
+    for row in rows:
+        group = row['_id']
+        if not group.get('day') or not group.get('museum_id'):
+            continue
+        revenue = row['amount'] + row['unpriced_tickets'] * entry_fee(catalog_cache.get_museum(group['museum_id']))
+        for kind, key in _keys(group['museum_id'], group.get('payment_method')):
+            doc = totals.setdefault(_doc_id(kind, key, group['day']), {
+                '_id': _doc_id(kind, key, group['day']), 'kind': kind, 'key': key, 'day': group['day'],
+                'bookings': 0, 'tickets': 0, 'revenue': 0
+            })
+            doc['bookings'] += row['bookings']
+            doc['tickets'] += row['tickets']
+            doc['revenue'] += revenue
+
+    docs = list(totals.values())
+    for start in range(0, len(docs), WRITE_BATCH):
+        db.daily_rollups.bulk_write(
+            [ReplaceOne({'_id': doc['_id']}, doc, upsert=True) for doc in docs[start:start + WRITE_BATCH]],
+            ordered=False
+        )
+
+    # Days/keys that no longer have any bookings
+    stale = [doc['_id'] for doc in db.daily_rollups.find({'day': {'$gte': since.isoformat()}} if since else {}, {'_id': 1})
+             if doc['_id'] not in totals]
+    for start in range(0, len(stale), WRITE_BATCH):
+        db.daily_rollups.delete_many({'_id': {'$in': stale[start:start + WRITE_BATCH]}})
+    return len(docs)
+
+def _months_back(today, months):
+    year, month = today.year, today.month - (months - 1)
+    while month < 1:
+        month += 12
+        year -= 1
+    return datetime.date(year, month, 1)
+
+def get_monthly_trends(months=12, museum_id=None, today=None):
+    """
+    Per-month bookings, tickets and revenue for the last `months` months
+    (all museums, or one), plus revenue per payment method.
+    Reads at most a few hundred daily rollup documents.
+    """
+    db = get_db()
+    today = today or datetime.date.today()
+    start = _months_back(today, months)
+    labels = []
+    cursor = start
+    while cursor <= today:
+        labels.append(cursor.strftime('%Y-%m'))
+        cursor = (cursor.replace(day=28) + datetime.timedelta(days=4)).replace(day=1)
+    index = {month: i for i, month in enumerate(labels)}
+
+    kind, key = ('museum', str(museum_id)) if museum_id else ('all', '*')
+    series = {name: [0] * len(labels) for name in ('bookings', 'tickets', 'revenue')}
+    for doc in db.daily_rollups.find({'kind': kind, 'key': key, 'day': {'$gte': start.isoformat()}},
+                                     {'day': 1, 'bookings': 1, 'tickets': 1, 'revenue': 1}):
+        i = index.get(doc['day'][:7])
+        if i is not None:
+            for name in series:
+                series[name][i] += doc.get(name, 0)
+
+    by_method = {}
+    if not museum_id:
+        for doc in db.daily_rollups.find({'kind': 'payment_method', 'day': {'$gte': start.isoformat()}},
+                                         {'key': 1, 'day': 1, 'revenue': 1}):
+            i = index.get(doc['day'][:7])
+            if i is not None:
+                by_method.setdefault(doc['key'], [0] * len(labels))[i] += doc.get('revenue', 0)
+
+    series['revenue'] = [round(v, 2) for v in series['revenue']]
+    return {
+        'months': labels,
+        **series,
+        'revenue_by_payment_method': {k: [round(v, 2) for v in vals] for k, vals in by_method.items()}
+    }
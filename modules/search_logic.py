@@ -0,0 +1,189 @@
+from db import get_db
+from pymongo.errors import OperationFailure
+from bson.objectid import ObjectId
+from modules import catalog_cache
+from modules.geo_logic import geo_point
+from modules.rating_logic import rating_epoch
+from utils.pagination import keyset_stages, finish_keyset_page, encode_cursor, decode_cursor
+
+# Stable browse order for the public listing; _id breaks ties between equal names
+MUSEUM_SORT = [('museum_name', 1), ('_id', 1)]
+# "Top rated": materialized average first, then number of reviews
+RATING_SORT = [('average_rating', -1), ('total_reviews', -1), ('_id', 1)]
+
+def _and(clauses):
+    clauses = [c for c in clauses if c]
+    if not clauses:
+        return {}
+    if len(clauses) == 1:
+        return clauses[0]
+    return {'$and': clauses}
+
+def _query_clause(query, use_text):
+    if not query:
+        return {}
+    if use_text:
+        return {'$text': {'$search': query}}
+    return {'$or': [
+        {'museum_name': {'$regex': query, '$options': 'i'}},
+        {'description': {'$regex': query, '$options': 'i'}}
+    ]}
+
+def _location_clause(location):
+    if not location:
+        return {}
+    return {'$or': [
+        {'city': {'$regex': location, '$options': 'i'}},
+        {'state': {'$regex': location, '$options': 'i'}}
+    ]}
+
+def _rating_clause(min_rating):
+    if not min_rating:
+        return {}
+    return {'average_rating': {'$gte': min_rating}}
+
+def _faceted_search(db, query, category, location, after, before, per_page, user_id, use_text, near=None,
+                    by_rating=False, min_rating=None):
+    ranked = bool(query) and use_text and not near and not by_rating
+    offset_paged = ranked or bool(near)
+    category_match = {'museum_type': category} if category else {}
+    keyset_sort = RATING_SORT if by_rating else MUSEUM_SORT
+
+    # $text / $geoNear are only allowed in the first stage, so query + location
+    # filter up front; the category is applied inside the facets so the type
+    # facet still lists every type available for the current search.
+    base_match = _and([_query_clause(query, use_text), _location_clause(location), _rating_clause(min_rating)])
+    if near:
+        pipeline = [{'$geoNear': {
+            'near': geo_point(*near),
+            'distanceField': 'distance',
+            'spherical': True,
+            'query': base_match
+        }}]
+    else:
+        pipeline = [{'$match': base_match}]
+    if ranked:
+        pipeline.append({'$addFields': {'score': {'$meta': 'textScore'}}})
+
+    if offset_paged:
+        # Relevance/distance order has no stable key, so these pages carry an offset
+        cursor = decode_cursor(before) or decode_cursor(after) or {}
+        offset = max(cursor.get('o', 0), 0)
+        order = {'distance': 1, '_id': 1} if near else {'score': -1, '_id': 1}
+        page_stages = [{'$sort': order}, {'$skip': offset}, {'$limit': per_page + 1}]
+    else:
+        page_stages, state = keyset_stages(keyset_sort, per_page, after, before)
+
+    scoped = [{'$match': category_match}] if category_match else []
+    facets = {
+        'page': scoped + page_stages,
+        'total': scoped + [{'$count': 'n'}],
+        'museum_type': [
+            {'$group': {'_id': '$museum_type', 'count': {'$sum': 1}}},
+            {'$sort': {'_id': 1}}
+        ],
+        'state': scoped + [
+            {'$group': {'_id': '$state', 'count': {'$sum': 1}}},
+            {'$sort': {'count': -1}}
+        ]
+    }
+    if user_id:
+        # Piggy-back the wishlist on the same round trip
+        facets['wishlist'] = [
+            {'$limit': 1},
+            {'$lookup': {
+                'from': 'users',
+                'pipeline': [{'$match': {'_id': ObjectId(user_id)}}, {'$project': {'wishlist': 1}}],
+                'as': 'user'
+            }},
+            {'$project': {'_id': 0, 'wishlist': {'$ifNull': [{'$arrayElemAt': ['$user.wishlist', 0]}, []]}}}
+        ]
+    pipeline.append({'$facet': facets})
+
+    result = next(db.museums.aggregate(pipeline), {})
+    docs = result.get('page', [])
+    total = result['total'][0]['n'] if result.get('total') else 0
+
+    if offset_paged:
+        page = offset // per_page + 1
+        pagination = {
+            'next': encode_cursor({'o': offset + per_page, 'p': page + 1}) if len(docs) > per_page else None,
+            'prev': encode_cursor({'o': offset - per_page, 'p': page - 1}) if offset > 0 else None,
+            'page': page
+        }
+        museums = docs[:per_page]
+        for m in museums:
+            if 'distance' in m:
+                m['distance_km'] = m['distance'] / 1000.0
+    else:
+        museums, pagination = finish_keyset_page(docs, keyset_sort, per_page, state)
+    pagination['total'] = total
+
+    wishlist = result['wishlist'][0]['wishlist'] if result.get('wishlist') else []
+
+    return {
+        'museums': museums,
+        'pagination': pagination,
+        'facets': {
+            'museum_type': [f for f in result.get('museum_type', []) if f['_id']],
+            'state': [f for f in result.get('state', []) if f['_id']]
+        },
+        'wishlist': wishlist
+    }
+
+def _load_wishlist(db, user_id):
+    user = db.users.find_one({'_id': ObjectId(user_id)}, {'wishlist': 1})
+    return user.get('wishlist', []) if user else []
+
+def search_museums(query='', category='', location='', after=None, before=None, per_page=10, user_id=None, near=None,
+                   by_rating=False, min_rating=None):
+    """
+    Runs the whole /museums listing as a single $facet aggregation: the page,
+    the total, per-museum_type and per-state counts and (if user_id is given)
+    the user's wishlist.
+    Free-text queries use the text index and are sorted by relevance, each
+    result carrying its 'score'; plain browsing pages by (museum_name, _id).
+    With near=(lat, lng) results are ordered by distance via $geoNear on
+    the 2dsphere index (free text then uses regex, as $text and $geoNear
+    cannot be combined), each carrying 'distance_km'.
+    by_rating orders by the materialized average_rating instead;
+    min_rating keeps museums rated at least that high.
+    If an index is missing (e.g. a fresh database before create_indexes.py
+    ran) we fall back to regex / name order.
+    Results are memoized per catalog generation (and rating_epoch); on a
+    hit only the wishlist is read from the database.
+    """
+    db = get_db()
+    fetched = {}
+
+    # (use_text, near) modes to try, best first; the last one needs no special index
+    modes = []
+    if near:
+        modes.append((False, near))
+    elif query:
+        modes.append((True, None))
+    modes.append((False, None))
+
+    def load():
+        for use_text, near_point in modes:
+            try:
+                result = _faceted_search(db, query, category, location, after, before, per_page,
+                                         user_id, use_text, near_point, by_rating, min_rating)
+                break
+            except OperationFailure as e:
+                if (use_text, near_point) == modes[-1]:
+                    raise
+                print(f"Search index unavailable, falling back: {e}")
+        # The wishlist is per user, keep it out of the shared cache
+        fetched['wishlist'] = result.pop('wishlist')
+        return result
+
+    # Pages show and may sort by ratings, which change without a generation bump
+    result = catalog_cache.memoize(('search', query, category, location, after, before, per_page, near,
+                                    by_rating, min_rating, rating_epoch()), load)
+
+    if 'wishlist' in fetched:
+        wishlist = fetched['wishlist']
+    else:
+        wishlist = _load_wishlist(db, user_id) if user_id else []
+    return dict(result, wishlist=wishlist)
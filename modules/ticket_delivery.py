@@ -0,0 +1,55 @@
+from db import get_db
+from modules.job_queue import enqueue, job_handler, on_dead_letter
+from utils.pdf_generator import generate_ticket_pdf
+from utils.email_sender import send_booking_email
+from bson.objectid import ObjectId
+import datetime
+
+# Ticket PDF + confirmation email run as a background job so checkout can
+# return as soon as the booking is saved. Progress is tracked on the booking
+# itself in 'ticket_status': queued -> sent, or failed once retries run out.
+
+JOB_TYPE = 'send_ticket'
+
+def queue_ticket_delivery(booking_object_id):
+    """
+    Schedules the ticket email for a freshly inserted booking.
+    """
+    get_db().bookings.update_one(
+        {'_id': booking_object_id},
+        {'$set': {'ticket_status': 'queued'}}
+    )
+    return enqueue(JOB_TYPE, {'booking_id': str(booking_object_id)})
+
+def _set_status(booking_id, status, error=None):
+    update = {'ticket_status': status, 'ticket_updated_at': datetime.datetime.now()}
+    if error:
+        update['ticket_error'] = error
+    get_db().bookings.update_one({'_id': ObjectId(booking_id)}, {'$set': update})
+
+@job_handler(JOB_TYPE)
+def deliver_ticket(payload):
+    booking = get_db().bookings.find_one({'_id': ObjectId(payload['booking_id'])})
+    if not booking:
+        # Nothing to deliver; don't retry a deleted booking
+        print(f"Ticket job skipped, booking {payload['booking_id']} not found")
+        return
+    if booking.get('ticket_status') == 'sent':
+        # An earlier attempt sent it but its 'done' update didn't land
+        print(f"Ticket job skipped, booking {payload['booking_id']} already sent")
+        return
+
+    # Re-normalize keys for the ticket/email templates
+    email_data = dict(booking)
+    email_data['date'] = booking['tour_date']
+
+    pdf_buffer = generate_ticket_pdf(email_data)
+
+    if not send_booking_email(booking['email'], email_data, pdf_buffer):
+        raise RuntimeError(f"Email to {booking['email']} was not sent")
+
+    _set_status(payload['booking_id'], 'sent')
+
+@on_dead_letter(JOB_TYPE)
+def ticket_failed(payload):
+    _set_status(payload['booking_id'], 'failed', 'Email delivery failed after several attempts')
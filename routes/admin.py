@@ -1,11 +1,22 @@
-from flask import Blueprint, render_template, request, redirect, url_for, session, flash
+from flask import Blueprint, render_template, request, redirect, url_for, session, flash, send_file, jsonify, Response
 from db import get_db
 from bson.objectid import ObjectId
 from modules.admin_model import AdminModel
+from modules import catalog_cache
+from modules.rating_logic import empty_rating_fields
+from modules.admin_metrics import get_dashboard_metrics, chart_png
+from modules.rollup_logic import get_monthly_trends
+from modules.geo_logic import geo_point
+from utils.pagination import keyset_paginate, cached_count
+from utils.pdf_generator import generate_ticket_pdfs
 import uuid
+import datetime
 
 admin_bp = Blueprint('admin', __name__)
 
+# Max bookings in one bulk ticket reissue PDF
+REISSUE_LIMIT = 500
+
 def login_required_admin(f):
     def wrapper(*args, **kwargs):
         if 'user_id' not in session or session.get('role') != 'admin':
@@ -67,122 +78,73 @@ def logout():
     return redirect(url_for('admin.login'))
 
 
-def get_paginated_data(collection, query, page, per_page=10):
-    total = collection.count_documents(query)
-    total_pages = (total + per_page - 1) // per_page
-    
-    data = list(collection.find(query)
-                .sort('created_at', -1)
-                .skip((page - 1) * per_page)
-                .limit(per_page))
-    
-    return data, total_pages, page
+def get_paginated_data(collection, query, sort, per_page=10):
+    """
+    Keyset pagination driven by the opaque ?after= / ?before= tokens.
+    Totals come from a cached/estimated count rather than a count per view.
+    """
+    data, pagination = keyset_paginate(collection, query, sort, per_page,
+                                       after=request.args.get('after'),
+                                       before=request.args.get('before'))
+    total = cached_count(collection, query)
+    pagination['total'] = total
+    pagination['total_pages'] = max(1, (total + per_page - 1) // per_page)
+    return data, pagination
 
 @admin_bp.route('/dashboard')
 @login_required_admin
 def dashboard():
-    db = get_db()
     try:
-        metrics = {
-            'users': db.users.count_documents({}),
-            'museums': db.museums.count_documents({}),
-            'bookings': db.bookings.count_documents({}),
-            'reviews': db.reviews.count_documents({}),
-            'feedbacks': db.feedbacks.count_documents({})
-        }
+        # Cached; repeated loads don't touch the database
+        metrics = get_dashboard_metrics()
+        counts, charts = metrics['counts'], metrics['charts']
     except Exception as e:
         print(f"Dashboard DB Error: {e}")
-        metrics = {'users': 0, 'museums': 0, 'bookings': 0, 'reviews': 0, 'feedbacks': 0}
+        counts = {'users': 0, 'museums': 0, 'bookings': 0, 'reviews': 0, 'feedbacks': 0}
+        charts = None
         flash('Failed to load dashboard metrics. Check DB connection.', 'warning')
-    
-    # --- Graph Generation ---
-    import matplotlib
-    matplotlib.use('Agg') # Use non-interactive backend
-    import matplotlib.pyplot as plt
-    import io
-    import base64
-    from collections import Counter
-    
-    graphs = {}
-    
-    try:
-        # 1. Bookings by Museum (Top 5)
-        # Aggregate bookings by museum_name
-        pipeline = [
-            {"$group": {"_id": "$museum_name", "count": {"$sum": 1}}},
-            {"$sort": {"count": -1}},
-            {"$limit": 5}
-        ]
-        booking_data = list(db.bookings.aggregate(pipeline))
-        
-        if booking_data:
-            names = [item["_id"] for item in booking_data]
-            counts = [item["count"] for item in booking_data]
-            
-            # Top 5 Museums - Horizontal Bar Chart for better label readability
-            plt.figure(figsize=(7, 5))
-            # Use a dark goldenrod/brown palette to match the theme
-            colors = ['#8B4513', '#A0522D', '#CD853F', '#D2691E', '#DEB887']
-            
-            # Reverse lists to have the highest value on top
-            plt.barh(names[::-1], counts[::-1], color=colors[:len(names)]) 
-            plt.title('Top 5 Most Booked Museums', fontsize=12)
-            plt.xlabel('Number of Bookings', fontsize=10)
-            plt.tight_layout()
-            
-            # Save to buffer
-            buf = io.BytesIO()
-            plt.savefig(buf, format='png', dpi=100)
-            buf.seek(0)
-            graphs['top_museums'] = base64.b64encode(buf.getvalue()).decode('utf-8')
-            plt.close()
-            
-        # 2. Museums by Category (Pie Chart) with simplified labels
-        pipeline_types = [
-            {"$group": {"_id": "$museum_type", "count": {"$sum": 1}}}
-        ]
-        type_data = list(db.museums.aggregate(pipeline_types))
-        
-        if type_data:
-            # Filter out empty types
-            labels = [item["_id"] for item in type_data if item["_id"]]
-            sizes = [item["count"] for item in type_data if item["_id"]]
-            
-            # Clean up labels if they are too long, or use a legend
-            plt.figure(figsize=(7, 5))
-            
-            # Use a warm color palette
-            warm_colors = ['#8B4513', '#D2691E', '#CD853F', '#F4A460', '#DEB887', '#A52A2A']
-            
-            wedges, texts, autotexts = plt.pie(sizes, labels=None, autopct='%1.1f%%', 
-                                             startangle=140, pctdistance=0.85, colors=warm_colors[:len(sizes)])
-            
-            # Add a circle at the center to make it a Donut Chart (looks more modern)
-            centre_circle = plt.Circle((0,0),0.70,fc='white')
-            fig = plt.gcf()
-            fig.gca().add_artist(centre_circle)
-            
-            plt.legend(wedges, labels, title="Museum Types", loc="center left", bbox_to_anchor=(1, 0, 0.5, 1))
-            plt.title('Museum Types Distribution', fontsize=12)
-            plt.tight_layout()
-            
-            buf2 = io.BytesIO()
-            plt.savefig(buf2, format='png', dpi=100)
-            buf2.seek(0)
-            graphs['museum_types'] = base64.b64encode(buf2.getvalue()).decode('utf-8')
-            plt.close()
 
-    except Exception as e:
-        print(f"Error generating graphs: {e}")
-        # flash(f"Graph error: {e}", "warning") 
+    # Charts are drawn in the browser from the same data (see /admin/api/metrics)
+    return render_template('admin/dashboard.html', metrics=counts, charts=charts, active_page='dashboard')
+
+@admin_bp.route('/api/metrics')
+@login_required_admin
+def metrics_api():
+    response = jsonify(get_dashboard_metrics())
+    # Over the whole body: metrics['hash'] only covers the charts, not the counts
+    response.add_etag()
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response.make_conditional(request)
+
+@admin_bp.route('/api/trends')
+@login_required_admin
+def trends_api():
+    try:
+        months = max(1, min(int(request.args.get('months', 12)), 36))
+    except ValueError:
+        months = 12
+    return jsonify(get_monthly_trends(months, museum_id=request.args.get('museum_id') or None))
 
-    return render_template('admin/dashboard.html', metrics=metrics, active_page='dashboard', graphs=graphs)
+@admin_bp.route('/charts/<name>.png')
+@login_required_admin
+def chart_image(name):
+    metrics = get_dashboard_metrics()
+    etag = f"{name}-{metrics['hash']}"
+    if request.if_none_match.contains(etag):
+        return Response(status=304)
+    png = chart_png(name, metrics)
+    if png is None:
+        # Not abort(): login_required_admin would turn it into a redirect
+        return Response(status=404)
+    response = Response(png, mimetype='image/png')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
 
 @admin_bp.route('/museums')
 @login_required_admin
 def museums():
     db = get_db()
-    page = int(request.args.get('page', 1))
     q = request.args.get('q', '')
     type_filter = request.args.get('type', '')
     
@@ -198,14 +160,13 @@ def museums():
     today = {} # unused here effectively
     
     # Get distinct museum types for filter
-    museum_types = db.museums.distinct('museum_type')
+    museum_types = catalog_cache.get_categories()
     
-    museums_list, total_pages, current_page = get_paginated_data(db.museums, query, page)
+    museums_list, pagination = get_paginated_data(db.museums, query, [('museum_name', 1), ('_id', 1)])
     
     return render_template('admin/museums.html', 
                            museums=museums_list, 
-                           total_pages=total_pages, 
-                           current_page=current_page,
+                           pagination=pagination,
                            active_page='museums',
                            museum_types=museum_types)
 
@@ -213,26 +174,23 @@ def museums():
 @login_required_admin
 def users():
     db = get_db()
-    page = int(request.args.get('page', 1))
     q = request.args.get('q', '')
     
     query = {}
     if q:
         query['email'] = {'$regex': q, '$options': 'i'}
         
-    users_list, total_pages, current_page = get_paginated_data(db.users, query, page)
+    users_list, pagination = get_paginated_data(db.users, query, [('created_at', -1), ('_id', -1)])
     
     return render_template('admin/users.html', 
                            users=users_list, 
-                           total_pages=total_pages, 
-                           current_page=current_page,
+                           pagination=pagination,
                            active_page='users')
 
 @admin_bp.route('/bookings')
 @login_required_admin
 def bookings():
     db = get_db()
-    page = int(request.args.get('page', 1))
     q = request.args.get('q', '')
     
     query = {}
@@ -242,19 +200,40 @@ def bookings():
             {'museum_name': {'$regex': q, '$options': 'i'}}
         ]
         
-    bookings_list, total_pages, current_page = get_paginated_data(db.bookings, query, page)
+    bookings_list, pagination = get_paginated_data(db.bookings, query, [('booking_date', -1), ('_id', -1)])
     
     return render_template('admin/bookings.html', 
                            bookings=bookings_list, 
-                           total_pages=total_pages, 
-                           current_page=current_page,
+                           pagination=pagination,
                            active_page='bookings')
 
+@admin_bp.route('/bookings/tickets.pdf')
+@login_required_admin
+def reissue_tickets():
+    db = get_db()
+    q = request.args.get('q', '')
+
+    query = {}
+    if q:
+        query['$or'] = [
+            {'email': {'$regex': q, '$options': 'i'}},
+            {'museum_name': {'$regex': q, '$options': 'i'}}
+        ]
+
+    # One multi-page PDF for all matching bookings (capped)
+    bookings_list = db.bookings.find(query).sort('booking_date', -1).limit(REISSUE_LIMIT)
+    tickets = [dict(b, date=b.get('tour_date')) for b in bookings_list]
+    if not tickets:
+        flash('No bookings match this search.', 'info')
+        return redirect(url_for('admin.bookings', q=q))
+
+    return send_file(generate_ticket_pdfs(tickets), mimetype='application/pdf',
+                     as_attachment=True, download_name='tickets.pdf')
+
 @admin_bp.route('/reviews')
 @login_required_admin
 def reviews():
     db = get_db()
-    page = int(request.args.get('page', 1))
     q = request.args.get('q', '')
     rating = request.args.get('rating', '')
     
@@ -264,45 +243,53 @@ def reviews():
     if rating:
         query['rating'] = int(rating)
         
-    reviews_list, total_pages, current_page = get_paginated_data(db.reviews, query, page)
+    reviews_list, pagination = get_paginated_data(db.reviews, query, [('created_at', -1), ('_id', -1)])
     
     return render_template('admin/reviews.html', 
                            reviews=reviews_list, 
-                           total_pages=total_pages, 
-                           current_page=current_page,
+                           pagination=pagination,
                            active_page='reviews')
 
 @admin_bp.route('/feedbacks')
 @login_required_admin
 def feedbacks():
     db = get_db()
-    page = int(request.args.get('page', 1))
     q = request.args.get('q', '')
     
     query = {}
     if q:
         query['message'] = {'$regex': q, '$options': 'i'}
         
-    feedbacks_list, total_pages, current_page = get_paginated_data(db.feedbacks, query, page)
+    feedbacks_list, pagination = get_paginated_data(db.feedbacks, query, [('created_at', -1), ('_id', -1)])
     
     return render_template('admin/feedbacks.html', 
                            feedbacks=feedbacks_list, 
-                           total_pages=total_pages, 
-                           current_page=current_page,
+                           pagination=pagination,
                            active_page='feedbacks')
 
+def _form_coordinates():
+    # {'latitude', 'longitude', 'location'} from the optional form fields, {}
+    # when both are blank; raises ValueError for partial or out-of-range input
+    lat, lng = request.form.get('latitude', '').strip(), request.form.get('longitude', '').strip()
+    if not lat and not lng:
+        return {}
+    lat, lng = float(lat), float(lng)
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+        raise ValueError('coordinates out of range')
+    # 'location' is what $geoNear ("Nearest to me") reads
+    return {'latitude': lat, 'longitude': lng, 'location': geo_point(lat, lng)}
+
 @admin_bp.route('/museum/add', methods=['GET', 'POST'])
 @login_required_admin
 def add_museum():
     db = get_db()
     
     # Fetch distinct categories for the dropdown
-    categories = db.museums.distinct('museum_type')
-    categories = [c for c in categories if c]
+    categories = catalog_cache.get_categories()
     
     if request.method == 'POST':
         name = request.form.get('name')
-        location = request.form.get('location') # Using location as address
+        location = request.form.get('location') # Stored as 'address'; 'location' is the GeoJSON point
         city = request.form.get('city') if request.form.get('city') else location.split(',')[0].strip() # Fallback extraction
         state = request.form.get('state') if request.form.get('state') else 'Unknown'
         
@@ -310,13 +297,18 @@ def add_museum():
         custom_category = request.form.get('custom_category')
         description = request.form.get('description')
         max_capacity = int(request.form.get('capacity', 1000))
+        try:
+            coordinates = _form_coordinates()
+        except ValueError:
+            flash('Latitude and longitude must both be numbers (-90 to 90, -180 to 180).', 'danger')
+            return render_template('admin/add_museum.html', categories=categories)
 
         # Handle Custom Category
         final_category = custom_category if category == 'Other' and custom_category else category
         
         new_museum = {
             'museum_name': name,
-            'location': location,
+            'address': location,
             'city': city,
             'state': state,
             'museum_type': final_category,
@@ -326,8 +318,11 @@ def add_museum():
             'created_at': datetime.datetime.now(),
             'museum_id': str(uuid.uuid4())
         }
+        new_museum.update(coordinates)
+        new_museum.update(empty_rating_fields())
         
         db.museums.insert_one(new_museum)
+        catalog_cache.bump_catalog_version()
         flash('Museum added successfully!', 'success')
         return redirect(url_for('admin.dashboard'))
         
@@ -346,7 +341,13 @@ def edit_museum(id):
             'description': request.form.get('description'),
             'max_daily_capacity': int(request.form.get('capacity', 1000))
         }
+        try:
+            updated_data.update(_form_coordinates())
+        except ValueError:
+            flash('Latitude and longitude must both be numbers (-90 to 90, -180 to 180).', 'danger')
+            return redirect(url_for('admin.edit_museum', id=id))
         db.museums.update_one({'_id': ObjectId(id)}, {'$set': updated_data})
+        catalog_cache.bump_catalog_version()
         flash('Museum updated successfully!', 'success')
         return redirect(url_for('admin.dashboard'))
     
@@ -358,5 +359,6 @@ def edit_museum(id):
 def delete_museum(id):
     db = get_db()
     db.museums.delete_one({'_id': ObjectId(id)})
+    catalog_cache.bump_catalog_version()
     flash('Museum deleted.', 'info')
     return redirect(url_for('admin.dashboard'))
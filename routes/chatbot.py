@@ -1,5 +1,6 @@
-from flask import Blueprint, request, jsonify, render_template
-from modules.chatbot_logic import get_chatbot_response
+from flask import Blueprint, request, jsonify, render_template, Response
+from modules.chatbot_logic import get_chatbot_response, chatbot_status, stream_chatbot_response
+import json
 
 chatbot_bp = Blueprint('chatbot', __name__)
 
@@ -18,6 +19,50 @@ def ask():
         print(f"Chatbot Error: {e}")
         return jsonify({'error': 'Failed to process request. Please check database/model Status.'}), 500
 
+@chatbot_bp.route('/stream', methods=['GET', 'POST'])
+def stream():
+    """
+    Server-Sent Events: one `data: {"token": ...}` event per piece of the
+    answer as it is generated, then `event: done`. Accepts ?query= (for
+    EventSource) or a JSON body like /ask.
+    """
+    data = request.get_json(silent=True) or {}
+    query = data.get('query') or request.args.get('query', '')
+
+    if not query:
+        return jsonify({'error': 'No query provided'}), 400
+
+    def events():
+        # Werkzeug/gunicorn close this generator when the client disconnects,
+        # which stops the generation upstream
+        tokens = stream_chatbot_response(query)
+        try:
+            for token in tokens:
+                yield f"data: {json.dumps({'token': token})}\n\n"
+        except Exception as e:
+            print(f"Chatbot Error: {e}")
+            yield f"event: error\ndata: {json.dumps({'error': 'Failed to process request.'})}\n\n"
+        finally:
+            tokens.close()
+        yield "event: done\ndata: {}\n\n"
+
+    return Response(events(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'  # don't let nginx buffer the stream
+    })
+
+@chatbot_bp.route('/health')
+def health():
+    """
+    Readiness of the chatbot model: 200 once it can answer, 503 while it is
+    loading, failed or disabled. Includes load timings.
+    """
+    status = chatbot_status()
+    response = jsonify(status)
+    response.status_code = 200 if status['status'] == 'ready' else 503
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
 @chatbot_bp.route('/chat')
 def chat_interface():
     return render_template('chatbot_full.html')
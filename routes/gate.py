@@ -0,0 +1,38 @@
+from flask import Blueprint, request, jsonify, session
+from modules.gate_logic import verify_scan
+import hmac
+import os
+
+gate_bp = Blueprint('gate', __name__)
+
+# Max payloads in one batched request (lanes that queue scans while offline)
+MAX_BATCH = 500
+
+def _authorized():
+    # Scanner devices send X-Gate-Key; without GATE_API_KEY only admins may scan
+    api_key = os.getenv('GATE_API_KEY')
+    if api_key:
+        return hmac.compare_digest(request.headers.get('X-Gate-Key', ''), api_key)
+    return session.get('role') == 'admin'
+
+@gate_bp.route('/verify', methods=['POST'])
+def verify():
+    if not _authorized():
+        return jsonify({'error': 'unauthorized'}), 401
+
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        data = {}
+    museum_id = data.get('museum_id')
+    lane = data.get('lane')
+
+    if 'payloads' in data:
+        payloads = data['payloads']
+        if not isinstance(payloads, list) or len(payloads) > MAX_BATCH:
+            return jsonify({'error': f'payloads must be a list of at most {MAX_BATCH} items'}), 400
+        return jsonify({'results': [verify_scan(p, museum_id, lane) for p in payloads]})
+
+    payload = data.get('payload')
+    if not payload:
+        return jsonify({'error': 'No payload provided'}), 400
+    return jsonify(verify_scan(payload, museum_id, lane))
@@ -2,15 +2,36 @@ from flask import Blueprint, render_template, request, redirect, url_for, flash,
 from db import get_db
 from bson.objectid import ObjectId
 import datetime
+import math
 import uuid
 import io
-from modules.recommendation_logic import get_recommendations
+from modules.recommendation_logic import get_recommendations, recommendation_seeds
+from modules.co_visit_logic import also_visited, record_interaction
+from modules.rating_logic import record_rating
+from modules.review_logic import get_review_feed
+from modules.admin_metrics import invalidate_dashboard_metrics
+from modules.rollup_logic import record_booking, entry_fee
+from modules.search_logic import search_museums
+from modules import catalog_cache
+from modules.map_logic import get_map_clusters
+from modules.geo_logic import find_nearest_museums
+from modules.inventory_logic import reserve_tickets, confirm_hold, release_tickets
+from modules.availability_logic import get_month_availability, is_open_on
 from modules.user_model import UserModel
-from utils.pdf_generator import generate_ticket_pdf
-from utils.email_sender import send_booking_email
+from modules.ticket_delivery import queue_ticket_delivery
+from utils.pagination import keyset_paginate
+from concurrent.futures import ThreadPoolExecutor
 
 users_bp = Blueprint('users', __name__)
 
+# Booking history on the dashboard, newest first; served by the
+# (user_id, booking_date, _id) index
+BOOKING_HISTORY_SORT = [('booking_date', -1), ('_id', -1)]
+DASHBOARD_BOOKINGS_PER_PAGE = 10
+
+# Shared by requests for running independent Mongo reads side by side
+_dashboard_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix='dashboard')
+
 from werkzeug.security import check_password_hash
 
 @users_bp.route('/register', methods=['GET', 'POST'])
@@ -61,64 +82,87 @@ def dashboard():
         return redirect(url_for('users.login'))
         
     db = get_db()
+    user_id = session['user_id']
+    after, before = request.args.get('after'), request.args.get('before')
+
+    # The independent reads run concurrently; each is a bounded indexed query
+    user_future = _dashboard_pool.submit(db.users.find_one, {'_id': ObjectId(user_id)}, {'wishlist': 1})
+    page_future = _dashboard_pool.submit(keyset_paginate, db.bookings, {'user_id': user_id},
+                                         BOOKING_HISTORY_SORT, DASHBOARD_BOOKINGS_PER_PAGE, after, before)
+    recent_future = None
+    if after or before:
+        # Recommendations follow the latest bookings, not the page being viewed
+        recent_future = _dashboard_pool.submit(
+            lambda: list(db.bookings.find({'user_id': user_id}, {'museum_id': 1, 'museum_name': 1})
+                         .sort(BOOKING_HISTORY_SORT).limit(DASHBOARD_BOOKINGS_PER_PAGE)))
+
+    user = user_future.result() or {}
+    bookings, pagination = page_future.result()
+    recent_bookings = recent_future.result() if recent_future else bookings
 
-    recommendations = get_recommendations(session['user_id'])
-    
-    recent_bookings = list(db.bookings.find({'user_id': session['user_id']}).sort('booking_date', -1))
-    
-    # Fetch Wishlist
-    user = db.users.find_one({'_id': ObjectId(session['user_id'])})
     wishlist_ids = user.get('wishlist', [])
-    wishlist_museums = []
-    if wishlist_ids:
-        # Convert string IDs back to ObjectId if needed, but assuming they are stored as strings for simplicity in toggle
-        # If stored as strings:
-        wishlist_museums = list(db.museums.find({'_id': {'$in': [ObjectId(i) for i in wishlist_ids]}}))
+    recent_ids = [b['museum_id'] for b in recent_bookings]
+    recommendations = get_recommendations(user_id, seeds=recommendation_seeds(recent_ids, wishlist_ids))
+
+    # "Visitors who booked X also visited", for the most recent booking
+    also_booked = None
+    if recent_bookings:
+        last = recent_bookings[0]
+        museums = also_visited(last['museum_id'], limit=4, exclude=recent_ids)
+        if museums:
+            also_booked = {'museum_name': last['museum_name'], 'museums': museums}
+    
+    # Wishlist holds string IDs; resolve them against the cached catalog
+    wishlist_museums = [m for m in (catalog_cache.get_museum(i) for i in wishlist_ids) if m]
         
     return render_template('users/dashboard.html', 
-                           bookings=recent_bookings, 
+                           bookings=bookings, 
+                           pagination=pagination,
                            recommendations=recommendations,
+                           also_booked=also_booked,
                            wishlist=wishlist_museums)
 
 @users_bp.route('/museums')
 def museums_list():
-    db = get_db()
-
-    page = int(request.args.get('page', 1))
     per_page = 10
-    skip = (page - 1) * per_page
 
     query = request.args.get('q', '').strip()
     category = request.args.get('category', '').strip()
     location = request.args.get('location', '').strip()
+    sort = request.args.get('sort', '')
+    try:
+        min_rating = int(request.args.get('min_rating') or 0) or None
+    except ValueError:
+        min_rating = None
+
+    # "Nearest first" needs the visitor's position; rounded (~100 m) so cached pages are shared
+    near = None
+    if sort == 'distance':
+        try:
+            near = (round(float(request.args['lat']), 3), round(float(request.args['lng']), 3))
+        except (KeyError, ValueError):
+            sort = ''
 
-    filters = {}
-    if query:
-        filters['$or'] = [
-            {'museum_name': {'$regex': query, '$options': 'i'}},
-            {'description': {'$regex': query, '$options': 'i'}}
-        ]
-    if category:
-        filters['museum_type'] = category
-    if location:
-        filters['$or'] = [
-            {'city': {'$regex': location, '$options': 'i'}},
-            {'state': {'$regex': location, '$options': 'i'}}
-        ]
-    
     try:
-        museum_data = list(db.museums.find(filters).skip(skip).limit(per_page))
-        total = db.museums.count_documents(filters)
-        import math
-        total_pages = math.ceil(total / per_page)
-        categories = db.museums.distinct('museum_type')
-        
-        # Get user's wishlist if logged in
-        wishlist_ids = []
-        if 'user_id' in session:
-            user = db.users.find_one({'_id': ObjectId(session['user_id'])})
-            if user:
-                wishlist_ids = user.get('wishlist', [])
+        # One aggregation: page, total, facet counts and wishlist
+        result = search_museums(query, category, location,
+                                after=request.args.get('after'),
+                                before=request.args.get('before'),
+                                per_page=per_page,
+                                user_id=session.get('user_id'),
+                                near=near,
+                                by_rating=(sort == 'rating'),
+                                min_rating=min_rating)
+        museum_data = result['museums']
+        pagination = result['pagination']
+        total = pagination['total']
+        total_pages = max(1, (total + per_page - 1) // per_page)
+        type_facets = result['facets']['museum_type']
+        state_facets = result['facets']['state']
+        categories = [f['_id'] for f in type_facets]
+        wishlist_ids = result['wishlist']
+        # Served from memory, so kept out of the cached search result
+        also_visited_by_id = {str(m['_id']): also_visited(m['_id'], limit=3) for m in museum_data}
     except Exception as e:
         print(f"Museums List DB Error: {e}")
         flash('Error fetching museums. Please check connection.', 'danger')
@@ -126,41 +170,75 @@ def museums_list():
 
     return render_template('users/museums.html', 
                            museums=museum_data, 
-                           page=page, 
+                           pagination=pagination, 
                            total=total, 
                            total_pages=total_pages,
                            per_page=per_page,
                            categories=categories,
+                           type_facets=type_facets,
+                           state_facets=state_facets,
                            search_query=query,
                            search_location=location,
                            search_category=category,
+                           search_sort=sort,
+                           search_min_rating=min_rating,
+                           near=near,
+                           also_visited=also_visited_by_id,
                            wishlist_ids=wishlist_ids)
 
+@users_bp.route('/museums/near')
+def museums_near():
+    try:
+        lat = float(request.args['lat'])
+        lng = float(request.args['lng'])
+        k = min(max(int(request.args.get('k', 5)), 1), 50)
+    except (KeyError, ValueError):
+        return jsonify({'error': 'lat and lng are required numbers, k an integer'}), 400
+
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+        return jsonify({'error': 'Coordinates out of range'}), 400
+
+    museums = find_nearest_museums(lat, lng, k)
+    return jsonify({'museums': [{
+        'id': str(m['_id']),
+        'museum_name': m.get('museum_name'),
+        'museum_type': m.get('museum_type'),
+        'city': m.get('city'),
+        'state': m.get('state', ''),
+        'latitude': m.get('latitude'),
+        'longitude': m.get('longitude'),
+        'distance_km': round(m['distance_km'], 2)
+    } for m in museums]})
+
 @users_bp.route('/book/<museum_id>', methods=['POST'])
 def book_museum(museum_id):
     if 'user_id' not in session:
         return jsonify({'error': 'Unauthorized'}), 401
         
-    db = get_db()
     date = request.form.get('date')
     tickets = int(request.form.get('tickets', 1))
+    if not date or tickets < 1:
+        return jsonify({'error': 'Please choose a date and at least one ticket.'}), 400
     
-    museum = db.museums.find_one({'_id': ObjectId(museum_id)})
+    museum = catalog_cache.get_museum(museum_id)
     if not museum:
         return jsonify({'error': 'Museum not found'}), 404
 
+    try:
+        tour_day = datetime.datetime.strptime(date, '%Y-%m-%d').date()
+    except ValueError:
+        return jsonify({'error': 'Invalid date.'}), 400
+    if not is_open_on(museum, tour_day):
+        return jsonify({'error': 'The museum is closed on this date.'}), 400
+
     max_capacity = museum.get('max_daily_capacity') or 1000
+    if tickets > max_capacity:
+        return jsonify({'error': f'You can book at most {max_capacity} tickets for one day.'}), 400
 
-    # Aggregate existing confirmed bookings
-    existing_bookings = db.bookings.aggregate([
-        {'$match': {'museum_id': museum_id, 'tour_date': date}},
-        {'$group': {'_id': None, 'total_tickets': {'$sum': '$tickets'}}}
-    ])
-    result = list(existing_bookings)
-    current_booked = result[0]['total_tickets'] if result else 0
-    
-    if current_booked + tickets > max_capacity:
-        return jsonify({'error': f'Capacity exceeded. Only {max_capacity - current_booked} tickets remaining for this date.'}), 400
+    # Atomically hold the tickets while the visitor pays
+    hold_id, remaining = reserve_tickets(museum_id, date, tickets, max_capacity)
+    if not hold_id:
+        return jsonify({'error': f'Capacity exceeded. Only {remaining} tickets remaining for this date.'}), 400
 
     # Instead of booking, save to session and redirect to payment
     session['pending_booking'] = {
@@ -170,12 +248,47 @@ def book_museum(museum_id):
         'museum_id': museum_id,
         'museum_name': museum['museum_name'],
         'date': date,
-        'tickets': tickets
+        'tickets': tickets,
+        'hold_id': hold_id
     }
     print(f"DEBUG: Stored pending_booking in session: {session['pending_booking']}")
     
     return jsonify({'payment_required': True, 'redirect_url': url_for('users.payment')})
 
+@users_bp.route('/api/museums/<museum_id>/availability')
+def museum_availability(museum_id):
+    month = request.args.get('month') or datetime.date.today().strftime('%Y-%m')
+    try:
+        availability = get_month_availability(museum_id, month)
+    except ValueError:
+        return jsonify({'error': 'month must be YYYY-MM'}), 400
+
+    if availability is None:
+        return jsonify({'error': 'Museum not found'}), 404
+
+    response = jsonify(availability)
+    response.headers['Cache-Control'] = 'public, max-age=30'
+    return response
+
+@users_bp.route('/api/museums/<museum_id>/reviews')
+def museum_reviews(museum_id):
+    try:
+        per_page = int(request.args.get('per_page', 10))
+        feed = get_review_feed(museum_id,
+                               sort=request.args.get('sort', 'recent'),
+                               after=request.args.get('after'),
+                               before=request.args.get('before'),
+                               per_page=per_page)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    if feed is None:
+        return jsonify({'error': 'Museum not found'}), 404
+
+    response = jsonify(feed)
+    response.headers['Cache-Control'] = 'public, max-age=30'
+    return response
+
 @users_bp.route('/payment', methods=['GET'])
 def payment():
     if 'pending_booking' not in session:
@@ -204,32 +317,47 @@ def process_payment():
     booking_data['payment_method'] = request.form.get('payment_method', 'Card')
     booking_data['payment_status'] = 'Paid' if booking_data['payment_method'] != 'Cash' else 'Pending (Pay at Venue)'
     
+    # Convert the capacity hold into confirmed tickets (re-reserves if it expired)
+    museum = catalog_cache.get_museum(booking_data['museum_id'])
+    capacity = museum.get('max_daily_capacity') if museum else None
+    # Price paid, kept on the booking for revenue reporting
+    booking_data['amount'] = booking_data['tickets'] * entry_fee(museum)
+    hold_id = booking_data.pop('hold_id', None)
+    if not confirm_hold(booking_data['museum_id'], booking_data['tour_date'], hold_id, booking_data['tickets'], capacity):
+        session.pop('pending_booking', None)
+        flash('Sorry, your ticket hold expired and this date is now sold out.', 'danger')
+        return redirect(url_for('users.museums_list'))
+
     print(f"DEBUG: Inserting booking into DB: {booking_data}")
     # 2. Insert into DB
     try:
         result = db.bookings.insert_one(booking_data)
         print(f"DEBUG: Inserted with ID: {result.inserted_id}")
+        record_interaction(booking_data['user_id'], booking_data['museum_id'])
+        invalidate_dashboard_metrics()
     except Exception as e:
         print(f"DEBUG: Error inserting into DB: {e}")
+        release_tickets(booking_data['museum_id'], booking_data['tour_date'], booking_data['tickets'])
         flash('Error saving booking.', 'danger')
         return redirect(url_for('users.dashboard'))
     
-    # 3. Generate PDF
-    pdf_buffer = generate_ticket_pdf(booking_data)
-    
-    # 4. Send Email (Async or Sync - Sync for now)
-    # Re-normalize keys for email template
-    email_data = booking_data.copy()
-    email_data['date'] = booking_data['tour_date'] 
-    
-    # We send to the logged-in user's email
-    send_booking_email(booking_data['email'], email_data, pdf_buffer)
+    # Daily analytics rollups; scripts/backfill_rollups.py repairs any misses
+    try:
+        record_booking(booking_data)
+    except Exception as e:
+        print(f"Failed to update booking rollups: {e}")
+
+    # 3. Ticket PDF + email are sent by a background worker
+    try:
+        queue_ticket_delivery(result.inserted_id)
+    except Exception as e:
+        print(f"Failed to queue ticket delivery: {e}")
     
     # Clear session
     session.pop('pending_booking', None)
     
-    # 5. Success Page or Dashboard
-    flash(f'Booking Confirmed! Ticket sent to {booking_data["email"]}', 'success')
+    # 4. Success Page or Dashboard
+    flash(f'Booking Confirmed! Your ticket is on its way to {booking_data["email"]}', 'success')
     return redirect(url_for('users.dashboard'))
 
 @users_bp.route('/review/<museum_id>', methods=['POST'])
@@ -238,10 +366,16 @@ def add_review(museum_id):
         return redirect(url_for('users.login'))
         
     db = get_db()
-    rating = int(request.form.get('rating'))
+    try:
+        rating = int(request.form.get('rating'))
+    except (TypeError, ValueError):
+        rating = 0
+    if rating < 1 or rating > 5:
+        flash('Please choose a rating from 1 to 5.', 'warning')
+        return redirect(url_for('users.museums_list'))
     comment = request.form.get('comment')
     
-    museum = db.museums.find_one({'_id': ObjectId(museum_id)})
+    museum = catalog_cache.get_museum(museum_id)
     if not museum:
         flash('Museum not found.', 'danger')
         return redirect(url_for('users.museums_list'))
@@ -266,6 +400,11 @@ def add_review(museum_id):
     }
     
     db.reviews.insert_one(review)
+    try:
+        record_rating(museum_id, rating)
+    except Exception as e:
+        # The review is saved; scripts/reconcile_ratings.py repairs the aggregates
+        print(f"Failed to update rating aggregates for {museum_id}: {e}")
     flash('Thank you for your review!', 'success')
     return redirect(url_for('users.museums_list'))
 
@@ -277,7 +416,7 @@ def submit_booked_feedback(museum_id):
     db = get_db()
     message = request.form.get('message')
     
-    museum = db.museums.find_one({'_id': ObjectId(museum_id)})
+    museum = catalog_cache.get_museum(museum_id)
     if not museum:
         flash('Museum not found.', 'danger')
         return redirect(url_for('users.dashboard'))
@@ -323,33 +462,36 @@ def toggle_wishlist(museum_id):
         action = 'removed'
     else:
         db.users.update_one({'_id': ObjectId(user_id)}, {'$addToSet': {'wishlist': museum_id}})
+        record_interaction(user_id, museum_id)
         action = 'added'
         
     return jsonify({'status': 'success', 'action': action})
 
 @users_bp.route('/map')
 def map_view():
-    db = get_db()
-    museums = list(db.museums.find())
-    
-    map_data = []
-    
-    for m in museums:
-        # Only include if coordinates exist
-        lat = m.get('latitude')
-        lng = m.get('longitude')
-        
-        if lat and lng:
-            map_data.append({
-                'museum_name': m.get('museum_name'),
-                'museum_type': m.get('museum_type'),
-                'city': m.get('city'),
-                'state': m.get('state', ''),
-                'latitude': lat,
-                'longitude': lng
-            })
-    
-    import json
-    return render_template('users/map.html', museums_json=json.dumps(map_data))
+    # Clusters/markers for the viewport are loaded asynchronously from map_clusters
+    return render_template('users/map.html')
+
+@users_bp.route('/api/map/clusters')
+def map_clusters():
+    try:
+        bbox = [float(v) for v in request.args.get('bbox', '').split(',')]
+        zoom = int(request.args.get('zoom', 5))
+        if len(bbox) != 4:
+            raise ValueError('bbox needs 4 values')
+        # float() accepts 'nan' and 'inf', which the grid math can't handle
+        if not all(math.isfinite(v) for v in bbox):
+            raise ValueError('bbox values must be finite')
+    except ValueError:
+        return jsonify({'error': 'Expected bbox=min_lng,min_lat,max_lng,max_lat and an integer zoom'}), 400
+
+    def clamp(value, limit):
+        return max(-limit, min(value, limit))
+
+    min_lng, min_lat, max_lng, max_lat = bbox
+    bbox = (clamp(min_lng, 180.0), clamp(min_lat, 90.0), clamp(max_lng, 180.0), clamp(max_lat, 90.0))
+    zoom = max(0, min(zoom, 22))
+
+    return jsonify(get_map_clusters(bbox, zoom))
         
     return render_template('users/feedback.html')
@@ -0,0 +1,16 @@
+import sys
+import os
+from datetime import date
+
+# Add parent directory to path to import db.py
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.rollup_logic import backfill_rollups
+
+# Usage: python scripts/backfill_rollups.py [YYYY-MM-DD]
+# Without a date the whole booking history is rolled up again.
+if __name__ == "__main__":
+    since = date.fromisoformat(sys.argv[1]) if len(sys.argv) > 1 else None
+    print(f"Rebuilding daily booking rollups{' since ' + since.isoformat() if since else ''}...")
+    count = backfill_rollups(since)
+    print(f"Wrote {count} rollup documents.")
@@ -0,0 +1,101 @@
+import sys
+import os
+import time
+from io import BytesIO
+
+# Add parent directory to path to import utils
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfgen import canvas
+from reportlab.lib.utils import ImageReader
+import qrcode
+
+from utils.pdf_generator import generate_ticket_pdf, generate_ticket_pdfs
+from utils.ticket_signing import sign_ticket
+
+os.environ.setdefault('TICKET_SIGNING_KEY', 'benchmark-only-key')
+
+def baseline_ticket_pdf(booking_data):
+    """
+    The previous renderer, kept here for comparison: redraws the whole page
+    and round-trips the QR code through a PNG. Encodes the signed payload
+    like the current renderer, so both do the same QR work.
+    """
+    buffer = BytesIO()
+    c = canvas.Canvas(buffer, pagesize=A4)
+    width, height = A4
+    primary_color = (0.54, 0.27, 0.07)
+    text_color = (0.2, 0.2, 0.2)
+
+    c.setFillColorRGB(*primary_color)
+    c.rect(0, height - 100, width, 100, fill=1, stroke=0)
+    c.setFillColorRGB(1, 1, 1)
+    c.setFont("Helvetica-Bold", 30)
+    c.drawCentredString(width / 2, height - 60, "MUSEUM TICKET")
+
+    c.setFillColorRGB(*text_color)
+    c.setFont("Helvetica-Bold", 22)
+    c.drawCentredString(width / 2, height - 150, booking_data.get('museum_name', 'Museum'))
+
+    c.setStrokeColorRGB(*primary_color)
+    c.setLineWidth(2)
+    c.rect(50, height - 400, width - 100, 200, stroke=1, fill=0)
+
+    y_pos = height - 250
+    fields = [
+        ("Visitor:", booking_data.get('user_name', 'Visitor')),
+        ("Date:", booking_data.get('date', 'N/A')),
+        ("Tickets:", str(booking_data.get('tickets', 1))),
+        ("Booking ID:", str(booking_data.get('booking_id', 'N/A')))
+    ]
+    for label, value in fields:
+        c.setFont("Helvetica-Bold", 14)
+        c.drawString(80, y_pos, label)
+        c.setFont("Helvetica", 14)
+        c.drawString(200, y_pos, value)
+        y_pos -= 30
+
+    qr = qrcode.QRCode(version=1, error_correction=qrcode.constants.ERROR_CORRECT_L, box_size=10, border=4)
+    # Same signed payload the current renderer encodes, so both draw the same QR
+    qr.add_data(sign_ticket(booking_data))
+    qr.make(fit=True)
+    img = qr.make_image(fill_color="black", back_color="white")
+    qr_buffer = BytesIO()
+    img.save(qr_buffer)
+    qr_buffer.seek(0)
+    c.drawImage(ImageReader(qr_buffer), width - 200, height - 380, width=120, height=120)
+    c.drawString(width - 180, height - 395, "Scan to Verify")
+
+    c.setFont("Helvetica-Oblique", 10)
+    c.drawCentredString(width / 2, 50, "Thank you for preserving our heritage. Enjoy your visit!")
+    c.drawCentredString(width / 2, 35, "Generated by PixelPast Museum Management System")
+
+    c.save()
+    buffer.seek(0)
+    return buffer
+
+def sample_booking(i):
+    return {
+        'museum_name': 'National Museum, New Delhi',
+        'museum_id': '65a1f0c2e4b0a1b2c3d4e5f6',
+        'user_name': 'Visitor',
+        'date': '2026-01-15',
+        'tickets': 2,
+        'booking_id': f"{i:08X}"
+    }
+
+def bench(label, fn, count):
+    start = time.perf_counter()
+    size = fn(count)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<32} {count / elapsed:8.1f} tickets/sec   ({size / count / 1024:.1f} KB/ticket)")
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    bookings = [sample_booking(i) for i in range(count)]
+
+    print(f"Rendering {count} tickets\n")
+    bench("baseline (one PDF per ticket)", lambda n: sum(len(baseline_ticket_pdf(b).getvalue()) for b in bookings[:n]), count)
+    bench("generate_ticket_pdf", lambda n: sum(len(generate_ticket_pdf(b).getvalue()) for b in bookings[:n]), count)
+    bench("generate_ticket_pdfs (batch)", lambda n: len(generate_ticket_pdfs(bookings[:n]).getvalue()), count)
@@ -0,0 +1,12 @@
+import sys
+import os
+
+# Add parent directory to path to import db.py
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.recommendation_logic import build_recommendation_index, ARTIFACT_DIR
+
+if __name__ == "__main__":
+    print("Building museum recommendation index...")
+    count = build_recommendation_index()
+    print(f"Indexed {count} museums into {ARTIFACT_DIR}")
@@ -1,4 +1,4 @@
-from pymongo import ASCENDING, DESCENDING, TEXT
+from pymongo import ASCENDING, DESCENDING, TEXT, GEOSPHERE
 import sys
 import os
 
@@ -42,10 +42,72 @@ def create_indexes():
         ("tour_date", DESCENDING)
     ])
     
+    # Dashboard booking history: one user's bookings, newest first
+    print("Index: bookings.user_id_booking_date_id")
+    db.bookings.create_index([
+        ("user_id", ASCENDING),
+        ("booking_date", DESCENDING),
+        ("_id", DESCENDING)
+    ])
+    
     # 4. Reviews: Lookups by museum
     print("Index: reviews.museum_id")
     db.reviews.create_index([("museum_id", ASCENDING)])
+
+    # Public review feed: newest first, or highest rated first
+    print("Index: reviews.museum_id_created_at_id")
+    db.reviews.create_index([("museum_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)])
+    print("Index: reviews.museum_id_rating_created_at_id")
+    db.reviews.create_index([("museum_id", ASCENDING), ("rating", DESCENDING),
+                             ("created_at", DESCENDING), ("_id", DESCENDING)])
     
+    # 5. Keyset pagination: one index per listing sort order
+    print("Index: bookings.booking_date_id")
+    db.bookings.create_index([("booking_date", DESCENDING), ("_id", DESCENDING)])
+
+    print("Index: museums.museum_name_id")
+    db.museums.create_index([("museum_name", ASCENDING), ("_id", ASCENDING)])
+
+    print("Index: museums.average_rating_total_reviews_id")
+    db.museums.create_index([("average_rating", DESCENDING), ("total_reviews", DESCENDING), ("_id", ASCENDING)])
+
+    for name in ("users", "reviews", "feedbacks"):
+        print(f"Index: {name}.created_at_id")
+        db[name].create_index([("created_at", DESCENDING), ("_id", DESCENDING)])
+
+    # 6. Museums: GeoJSON location for $geoNear / near-me queries.
+    # Older admin-added museums kept their address in 'location'; move it
+    # out of the way first, since a 2dsphere index rejects plain strings.
+    print("Backfilling museums.location from latitude/longitude")
+    db.museums.update_many(
+        {'location': {'$type': 'string'}, 'address': {'$exists': False}},
+        {'$rename': {'location': 'address'}}
+    )
+    db.museums.update_many({'location': {'$type': 'string'}}, {'$unset': {'location': ''}})
+    db.museums.update_many(
+        {'latitude': {'$type': 'number'}, 'longitude': {'$type': 'number'}},
+        [{'$set': {'location': {'type': 'Point', 'coordinates': ['$longitude', '$latitude']}}}]
+    )
+
+    print("Index: museums.location (2dsphere)")
+    db.museums.create_index([("location", GEOSPHERE)])
+
+    # 7. Inventory: month range reads for the availability calendar
+    print("Index: inventory.museum_id_tour_date")
+    db.inventory.create_index([("museum_id", ASCENDING), ("tour_date", ASCENDING)])
+
+    # 8. Job queue: workers claim the oldest due job
+    print("Index: jobs.status_run_at")
+    db.jobs.create_index([("status", ASCENDING), ("run_at", ASCENDING)])
+
+    # 9. Gate scans: lanes pull recent scans for the current dates
+    print("Index: gate_scans.tour_date_scanned_at")
+    db.gate_scans.create_index([("tour_date", ASCENDING), ("scanned_at", ASCENDING)])
+
+    # 10. Daily booking rollups: trend reads per kind/key over a date range
+    print("Index: daily_rollups.kind_key_day")
+    db.daily_rollups.create_index([("kind", ASCENDING), ("key", ASCENDING), ("day", ASCENDING)])
+
     print("Indexes created successfully!")
 
 if __name__ == "__main__":
@@ -65,6 +65,8 @@ def convert_and_import():
                 "pincode": None, # CSV doesn't have pincode
                 "latitude": lat,
                 "longitude": lng,
+                # GeoJSON point for the 2dsphere index (near-me queries)
+                "location": {"type": "Point", "coordinates": [lng, lat]} if lat is not None and lng is not None else None,
                 
                 # Default Fields
                 "opening_time": "10:00 AM",
@@ -91,8 +93,12 @@ def convert_and_import():
                 "video_url": None,
                 
                 # Stats
-                "average_rating": 4.5, # Default rating for good looks
+                # Rating aggregates, kept current by review writes (modules/rating_logic.py)
+                "average_rating": 0,
                 "total_reviews": 0,
+                "rating_count": 0,
+                "rating_sum": 0,
+                "rating_histogram": {"1": 0, "2": 0, "3": 0, "4": 0, "5": 0},
                 "annual_visitors": None,
                 "popularity_score": 0,
                 
@@ -129,6 +135,8 @@ def convert_and_import():
         print(f"Inserting {len(museums_list)} entries...")
         db.museums.insert_many(museums_list)
         print("Success! Database populated with CSV data.")
+        # Tell running app workers to drop their cached catalog
+        db.meta.update_one({'_id': 'catalog_version'}, {'$inc': {'generation': 1}}, upsert=True)
     else:
         print("Warning: No data found in CSV to import.")
 
@@ -0,0 +1,12 @@
+import sys
+import os
+
+# Add parent directory to path to import db.py
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.inventory_logic import rebuild_inventory
+
+if __name__ == "__main__":
+    print("Rebuilding booking inventory from bookings...")
+    count = rebuild_inventory()
+    print(f"Wrote {count} museum/date inventory documents.")
@@ -0,0 +1,12 @@
+import sys
+import os
+
+# Add parent directory to path to import db.py
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.rating_logic import reconcile_ratings
+
+if __name__ == "__main__":
+    print("Rebuilding museum rating aggregates from reviews...")
+    count = reconcile_ratings()
+    print(f"Updated {count} museums with reviews; all others reset to unrated.")
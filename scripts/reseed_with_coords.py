@@ -90,6 +90,7 @@ def reseed_museums():
         if match:
             m['latitude'] = match['latitude']
             m['longitude'] = match['longitude']
+            m['location'] = {'type': 'Point', 'coordinates': [match['longitude'], match['latitude']]}
             updated_count += 1
         else:
             # User wants to "take only proper... latitude and longitude in this take... only that museum's which is present"
@@ -97,6 +98,7 @@ def reseed_museums():
             # If CSV doesn't have it, set to None (removing randoms)
             m['latitude'] = None
             m['longitude'] = None
+            m['location'] = None
             
     print(f"Matched and updated coordinates for {updated_count} / {len(museums_data)} museums.")
     
@@ -113,6 +115,8 @@ def reseed_museums():
         print(f"Inserting {len(museums_data)} museums into MongoDB...")
         db.museums.insert_many(museums_data)
         print("Database update complete!")
+        # Tell running app workers to drop their cached catalog
+        db.meta.update_one({'_id': 'catalog_version'}, {'$inc': {'generation': 1}}, upsert=True)
     else:
         print("No data to insert.")
 
@@ -0,0 +1,19 @@
+import sys
+import os
+
+# Add parent directory to path to import the app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# This process does the work itself; don't also start in-app worker threads
+os.environ['JOB_WORKER_THREADS'] = '0'
+
+from main import create_app
+from modules.job_queue import run_worker
+
+if __name__ == "__main__":
+    app = create_app()
+    print("Job worker started. Press Ctrl+C to stop.")
+    try:
+        run_worker(app)
+    except KeyboardInterrupt:
+        print("Job worker stopped.")
@@ -6,6 +6,8 @@ import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from db import get_db
+from modules.catalog_cache import bump_catalog_version
+from modules.rating_logic import reconcile_ratings
 
 def seed_museums():
     db = get_db()
@@ -25,8 +27,14 @@ def seed_museums():
             
         collection.insert_many(data)
         print(f"Successfully inserted {len(data)} museums into the database.")
+        bump_catalog_version(db)
 
-        collection.create_index([("museum_name", "text"), ("description", "text")])
+        # Replace the placeholder ratings in the JSON with aggregates of real reviews
+        rated = reconcile_ratings(db)
+        print(f"Rating aggregates rebuilt ({rated} museums with reviews).")
+
+        # Same definition as scripts/create_indexes.py so /museums search can use it
+        collection.create_index([("museum_name", "text"), ("city", "text"), ("description", "text")], name="text_search")
         print("Created text indexes.")
         
     except FileNotFoundError:
@@ -0,0 +1,28 @@
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# db.py connects lazily, but needs a URI with a database name to import
+os.environ.setdefault('MONGO_URI', 'mongodb://localhost:27017/test')
+
+from modules.geo_logic import KDTree, _to_xyz
+
+def test_nearest_with_equal_distances():
+    # Several museums often share the same coordinates
+    museums = [{'museum_name': f"Museum {i}", 'latitude': 22.56, 'longitude': 88.35} for i in range(4)]
+    museums.append({'museum_name': 'Far', 'latitude': 28.61, 'longitude': 77.21})
+    tree = KDTree([(_to_xyz(m['latitude'], m['longitude']), m) for m in museums])
+
+    results = tree.nearest(_to_xyz(22.56, 88.35), 3)
+
+    assert len(results) == 3
+    assert all(m['museum_name'] != 'Far' for _, m in results)
+    assert [d for d, _ in results] == sorted(d for d, _ in results)
+
+def test_nearest_orders_by_distance():
+    points = [(22.56, 88.35), (28.61, 77.21), (19.07, 72.87)]
+    tree = KDTree([(_to_xyz(lat, lng), {'latitude': lat, 'longitude': lng}) for lat, lng in points])
+
+    results = tree.nearest(_to_xyz(28.0, 77.0), 3)
+
+    assert [m['latitude'] for _, m in results] == [28.61, 19.07, 22.56]
@@ -0,0 +1,76 @@
+import os
+import smtplib
+import socket
+import sys
+import time
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from flask_mail import Mail, Message
+from utils.mail_transport import SMTPPool
+
+aiosmtpd_controller = pytest.importorskip('aiosmtpd.controller')
+
+REFUSED = 'nobody@example.com'
+
+class RecordingHandler:
+    # Local stand-in SMTP server: keeps delivered messages, refuses REFUSED
+    def __init__(self):
+        self.delivered = []
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        if address == REFUSED:
+            return '550 5.1.1 No such user'
+        envelope.rcpt_tos.append(address)
+        return '250 OK'
+
+    async def handle_DATA(self, server, session, envelope):
+        self.delivered.append(envelope.rcpt_tos[:])
+        return '250 Message accepted for delivery'
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.config['MAIL_DEFAULT_SENDER'] = 'tickets@example.com'
+    Mail(app)
+    with app.app_context():
+        yield app
+
+@pytest.fixture
+def smtp_server():
+    handler = RecordingHandler()
+    controller = aiosmtpd_controller.Controller(handler, hostname='127.0.0.1', port=_free_port())
+    controller.start()
+    yield controller, handler
+    controller.stop()
+
+def _message(recipient):
+    return Message('Your ticket', recipients=[recipient], body='See attached.')
+
+def test_refused_recipient_does_not_stop_the_batch(app, smtp_server):
+    controller, handler = smtp_server
+    pool = SMTPPool(controller.hostname, controller.port, size=1, timeout=5)
+
+    results = pool.send_batch([_message('a@example.com'), _message(REFUSED), _message('b@example.com')])
+    pool.close()
+
+    assert results[0] is None and results[2] is None
+    assert isinstance(results[1], smtplib.SMTPRecipientsRefused)
+    assert handler.delivered == [['a@example.com'], ['b@example.com']]
+
+def test_unreachable_server_fails_fast(app):
+    pool = SMTPPool('127.0.0.1', _free_port(), size=1, timeout=5)
+
+    started = time.time()
+    results = pool.send_batch([_message('a@example.com'), _message('b@example.com')])
+
+    assert time.time() - started < 2
+    assert all(isinstance(r, OSError) for r in results)
@@ -0,0 +1,98 @@
+import threading
+import time
+from concurrent.futures import Future
+from queue import Queue, Empty
+
+# Micro-batching for work that is much cheaper per item in batches (model
+# inference). Concurrent callers submit() single items; one worker thread
+# waits up to max_wait seconds to collect up to batch_size of them and runs
+# them as one run_batch(items) call, then resolves each caller's Future with
+# its own result.
+
+class BatchScheduler:
+    """
+    run_batch(items) must return one result per item, in order. If it raises,
+    every item in that batch gets the exception.
+    submit() raises queue.Full once max_queue items are waiting.
+    """
+
+    def __init__(self, run_batch, batch_size=8, max_wait=0.01, max_queue=256, name='batch-scheduler'):
+        self.run_batch = run_batch
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        self.name = name
+        self._queue = Queue(maxsize=max_queue)
+        self._thread = None
+        self._lock = threading.Lock()
+        self._stats = {'batches': 0, 'items': 0, 'cancelled': 0, 'errors': 0, 'busy_seconds': 0.0}
+
+    def _ensure_thread(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+
+    def submit(self, item):
+        future = Future()
+        self._queue.put_nowait((item, future))
+        self._ensure_thread()
+        return future
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.time() + self.max_wait
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            # Callers that timed out cancel their Future; don't spend a slot on them
+            live = [(item, future) for item, future in batch if future.set_running_or_notify_cancel()]
+            with self._lock:
+                self._stats['cancelled'] += len(batch) - len(live)
+            if not live:
+                continue
+
+            started = time.time()
+            try:
+                results = self.run_batch([item for item, _ in live])
+            except Exception as e:
+                print(f"{self.name}: batch of {len(live)} failed: {e}")
+                with self._lock:
+                    self._stats['errors'] += 1
+                for _, future in live:
+                    future.set_exception(e)
+                continue
+            finally:
+                with self._lock:
+                    self._stats['batches'] += 1
+                    self._stats['items'] += len(live)
+                    self._stats['busy_seconds'] += time.time() - started
+
+            results = list(results)
+            for (_, future), result in zip(live, results):
+                future.set_result(result)
+            if len(results) != len(live):
+                # Never leave a caller waiting out its timeout for a result that isn't coming
+                error = RuntimeError(f"run_batch returned {len(results)} results for {len(live)} items")
+                print(f"{self.name}: {error}")
+                with self._lock:
+                    self._stats['errors'] += 1
+                for _, future in live[len(results):]:
+                    future.set_exception(error)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats['queued'] = self._queue.qsize()
+        stats['avg_batch_size'] = round(stats['items'] / stats['batches'], 2) if stats['batches'] else None
+        stats['busy_seconds'] = round(stats['busy_seconds'], 2)
+        return stats
@@ -2,6 +2,9 @@ from flask_mail import Message
 from extensions import mail
 from flask import current_app
 
+# How long a sender waits for its message to go out through the outbox
+SEND_TIMEOUT_SECONDS = 60
+
 def send_booking_email(to_email, booking_data, pdf_buffer):
     """
     Sends a booking confirmation email with the ticket PDF attached.
@@ -37,7 +40,14 @@ def send_booking_email(to_email, booking_data, pdf_buffer):
             data=pdf_buffer.getvalue()
         )
         
-        mail.send(msg)
+        outbox = current_app.extensions.get('mail_outbox')
+        if outbox is None:
+            mail.send(msg)
+        else:
+            # Pooled SMTP connection, batched with concurrent sends
+            error = outbox.submit(msg).result(timeout=SEND_TIMEOUT_SECONDS)
+            if error is not None:
+                raise error
         print(f"Email sent to {to_email}")
         return True
     
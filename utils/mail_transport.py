@@ -0,0 +1,217 @@
+import smtplib
+import ssl
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+from queue import Queue, Empty, LifoQueue
+from flask_mail import BadHeaderError, sanitize_address, sanitize_addresses
+
+# Flask-Mail's mail.send() opens, authenticates and tears down a TLS session
+# for every message. SMTPPool keeps a few authenticated connections open and
+# reuses them; MailOutbox collects messages from concurrent senders and hands
+# them to the pool in batches, one connection per batch.
+# Works against any SMTP server, including a local aiosmtpd debugging server
+# (MAIL_SERVER=localhost, MAIL_PORT=8025, MAIL_USE_TLS=False).
+
+class SMTPPool:
+    def __init__(self, host, port, username=None, password=None, use_tls=False, use_ssl=False,
+                 size=2, idle_timeout=60, timeout=30):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.use_tls = use_tls
+        self.use_ssl = use_ssl
+        self.size = size
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self._idle = LifoQueue()  # (smtp, last_used); most recently used first
+        self._slots = threading.BoundedSemaphore(size)
+
+    def _connect(self):
+        if self.use_ssl:
+            smtp = smtplib.SMTP_SSL(self.host, self.port, timeout=self.timeout,
+                                    context=ssl.create_default_context())
+        else:
+            smtp = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+            if self.use_tls:
+                smtp.starttls(context=ssl.create_default_context())
+        if self.username and self.password:
+            smtp.login(self.username, self.password)
+        return smtp
+
+    @staticmethod
+    def _quit(smtp):
+        try:
+            smtp.quit()
+        except Exception:
+            try:
+                smtp.close()
+            except Exception:
+                pass
+
+    def _checkout(self):
+        while True:
+            try:
+                smtp, last_used = self._idle.get_nowait()
+            except Empty:
+                return self._connect()
+            # Servers drop idle sessions; probe anything that sat around
+            if time.time() - last_used < self.idle_timeout:
+                return smtp
+            try:
+                if smtp.noop()[0] == 250:
+                    return smtp
+            except smtplib.SMTPException:
+                pass
+            except OSError:
+                pass
+            self._quit(smtp)
+
+    @contextmanager
+    def connection(self):
+        """
+        Borrows an authenticated connection, returning it to the pool on
+        success and discarding it if the session broke.
+        """
+        self._slots.acquire()
+        smtp = None
+        try:
+            smtp = self._checkout()
+            yield smtp
+            self._idle.put((smtp, time.time()))
+            smtp = None
+        finally:
+            if smtp is not None:
+                self._quit(smtp)
+            self._slots.release()
+
+    def send_batch(self, messages):
+        """
+        Sends flask_mail Messages over one pooled connection.
+        Returns a list of None (sent) or the exception for each message; one
+        bad recipient doesn't stop the rest of the batch. A dropped session is
+        reconnected once and the interrupted message retried.
+        """
+        results = [None] * len(messages)
+        pending = list(range(len(messages)))
+        reconnected = False
+
+        while pending:
+            try:
+                with self.connection() as smtp:
+                    while pending:
+                        i = pending[0]
+                        msg = messages[i]
+                        try:
+                            if msg.has_bad_headers():
+                                raise BadHeaderError
+                            if msg.date is None:
+                                msg.date = time.time()
+                            smtp.sendmail(sanitize_address(msg.sender),
+                                          list(sanitize_addresses(msg.send_to)),
+                                          msg.as_bytes(), msg.mail_options, msg.rcpt_options)
+                        except (BadHeaderError, smtplib.SMTPRecipientsRefused,
+                                smtplib.SMTPSenderRefused, smtplib.SMTPDataError) as e:
+                            results[i] = e
+                        pending.pop(0)
+            # SMTPException subclasses OSError, so the order of these matters
+            except smtplib.SMTPServerDisconnected as e:
+                error = e
+            except smtplib.SMTPException as e:
+                # Connect/login failures: nothing in this batch can go out
+                for i in pending:
+                    results[i] = e
+                break
+            except OSError as e:
+                # Dropped or refused connection
+                error = e
+            else:
+                break
+
+            if reconnected:
+                for i in pending:
+                    results[i] = error
+                break
+            reconnected = True
+        return results
+
+    def close(self):
+        while True:
+            try:
+                smtp, _ = self._idle.get_nowait()
+            except Empty:
+                return
+            self._quit(smtp)
+
+class MailOutbox:
+    """
+    Queues messages and flushes them through an SMTPPool in batches of up to
+    batch_size, waiting at most flush_interval seconds to fill a batch.
+    One flusher thread per pooled connection.
+    submit() returns a Future resolving to None (sent) or the exception.
+    """
+
+    def __init__(self, pool, app, batch_size=20, flush_interval=0.2):
+        self.pool = pool
+        self.app = app  # messages render inside an app context
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = Queue()
+        self._threads = []
+        self._lock = threading.Lock()
+
+    def _ensure_thread(self):
+        with self._lock:
+            self._threads = [t for t in self._threads if t.is_alive()]
+            while len(self._threads) < self.pool.size:
+                t = threading.Thread(target=self._run, name=f"mail-outbox-{len(self._threads)}", daemon=True)
+                t.start()
+                self._threads.append(t)
+
+    def submit(self, msg):
+        future = Future()
+        self._queue.put((msg, future))
+        self._ensure_thread()
+        return future
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except Empty:
+                    break
+            try:
+                with self.app.app_context():
+                    results = self.pool.send_batch([msg for msg, _ in batch])
+            except Exception as e:
+                results = [e] * len(batch)
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
+
+def init_mail_transport(app):
+    """
+    Creates the app's pooled outbox from the MAIL_* config.
+    Skipped when Flask-Mail would suppress sending (testing).
+    """
+    if app.config.get('MAIL_SUPPRESS_SEND', app.testing):
+        return None
+    pool = SMTPPool(
+        host=app.config.get('MAIL_SERVER', 'localhost'),
+        port=app.config.get('MAIL_PORT', 25),
+        username=app.config.get('MAIL_USERNAME'),
+        password=app.config.get('MAIL_PASSWORD'),
+        use_tls=app.config.get('MAIL_USE_TLS', False),
+        use_ssl=app.config.get('MAIL_USE_SSL', False),
+        size=app.config.get('MAIL_POOL_SIZE', 2)
+    )
+    outbox = MailOutbox(pool, app, batch_size=app.config.get('MAIL_BATCH_SIZE', 20))
+    app.extensions['mail_outbox'] = outbox
+    return outbox
@@ -0,0 +1,163 @@
+import base64
+import datetime
+import json
+import threading
+import time
+from collections import OrderedDict
+from bson.objectid import ObjectId
+
+# Totals are shown as "about N", so a slightly stale count is fine.
+COUNT_CACHE_TTL = 60
+# Distinct filtered counts kept (admin search strings are free-form), LRU
+MAX_COUNT_CACHE_ENTRIES = 256
+
+_count_lock = threading.Lock()
+_count_cache = OrderedDict()  # key -> (total, expires_at)
+
+def _encode_value(value):
+    if isinstance(value, ObjectId):
+        return {'$oid': str(value)}
+    if isinstance(value, datetime.datetime):
+        return {'$date': value.isoformat()}
+    return value
+
+def _decode_value(value):
+    if isinstance(value, dict):
+        if '$oid' in value:
+            return ObjectId(value['$oid'])
+        if '$date' in value:
+            return datetime.datetime.fromisoformat(value['$date'])
+    return value
+
+def encode_cursor(data):
+    """
+    Packs a cursor dict into an opaque, URL-safe token.
+    """
+    if 'k' in data:
+        data = dict(data, k=[_encode_value(v) for v in data['k']])
+    raw = json.dumps(data, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_cursor(token):
+    """
+    Reverses encode_cursor. Returns None for missing or tampered tokens so
+    callers simply fall back to the first page.
+    """
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        data = json.loads(raw)
+        if 'k' in data:
+            data['k'] = [_decode_value(v) for v in data['k']]
+        return data
+    except Exception:
+        return None
+
+def cached_count(collection, query, ttl=COUNT_CACHE_TTL):
+    """
+    Returns the number of documents matching query without counting on
+    every page view. Unfiltered listings use the collection metadata count;
+    filtered ones are counted once and cached for ttl seconds.
+    """
+    if not query:
+        return collection.estimated_document_count()
+
+    key = (collection.full_name, json.dumps(query, sort_keys=True, default=str))
+    now = time.time()
+    with _count_lock:
+        hit = _count_cache.get(key)
+        if hit and now < hit[1]:
+            _count_cache.move_to_end(key)
+            return hit[0]
+
+    total = collection.count_documents(query)
+
+    with _count_lock:
+        for stale in [k for k, (_, expires_at) in _count_cache.items() if expires_at <= now]:
+            del _count_cache[stale]
+        _count_cache[key] = (total, now + ttl)
+        _count_cache.move_to_end(key)
+        while len(_count_cache) > MAX_COUNT_CACHE_ENTRIES:
+            _count_cache.popitem(last=False)
+    return total
+
+def _keyset_filter(sort, values, forward):
+    # (a > x) OR (a == x AND b > y) ... for each sort key, flipped for descending keys
+    clauses = []
+    for i, (field, direction) in enumerate(sort):
+        clause = {sort[j][0]: values[j] for j in range(i)}
+        op = '$gt' if (direction == 1) == forward else '$lt'
+        clause[field] = {op: values[i]}
+        clauses.append(clause)
+    return {'$or': clauses}
+
+def _keyset_plan(sort, after=None, before=None):
+    # Returns (range filter or None, sort order to scan in, state for finish_keyset_page)
+    cursor = decode_cursor(before) or decode_cursor(after)
+    forward = not (before and cursor)
+
+    bound = None
+    if cursor and 'k' in cursor:
+        bound = _keyset_filter(sort, cursor['k'], forward)
+    order = sort if forward else [(field, -direction) for field, direction in sort]
+
+    return bound, order, {'cursor': cursor, 'forward': forward}
+
+def keyset_stages(sort, per_page=10, after=None, before=None):
+    """
+    Aggregation stages that select one keyset page; lets a caller embed the
+    page inside a larger pipeline (e.g. a $facet). Pass the fetched docs and
+    the returned state to finish_keyset_page.
+    """
+    bound, order, state = _keyset_plan(sort, after, before)
+
+    stages = [{'$match': bound}] if bound else []
+    stages.append({'$sort': dict(order)})
+    stages.append({'$limit': per_page + 1})
+    return stages, state
+
+def finish_keyset_page(docs, sort, per_page, state):
+    """
+    Trims the look-ahead row and builds the next/prev tokens.
+    Returns (documents, pagination).
+    """
+    cursor, forward = state['cursor'], state['forward']
+    page = cursor.get('p', 1) if cursor else 1
+
+    has_more = len(docs) > per_page
+    docs = docs[:per_page]
+    if not forward:
+        docs.reverse()
+
+    next_token = prev_token = None
+    if docs:
+        first = [docs[0].get(field) for field, _ in sort]
+        last = [docs[-1].get(field) for field, _ in sort]
+        if forward:
+            if has_more:
+                next_token = encode_cursor({'k': last, 'p': page + 1})
+            if cursor:
+                prev_token = encode_cursor({'k': first, 'p': page - 1})
+        else:
+            next_token = encode_cursor({'k': last, 'p': page + 1})
+            if has_more:
+                prev_token = encode_cursor({'k': first, 'p': page - 1})
+
+    return docs, {'next': next_token, 'prev': prev_token, 'page': page}
+
+def keyset_paginate(collection, query, sort, per_page=10, after=None, before=None, projection=None):
+    """
+    Cursor-based pagination. sort must end with a unique field (normally
+    _id), e.g. [('created_at', -1), ('_id', -1)]. Each page is a single
+    indexed range scan, however deep the caller has paged.
+    Returns (documents, pagination) where pagination holds the opaque
+    'next'/'prev' tokens and the 1-based 'page' number.
+    """
+    bound, order, state = _keyset_plan(sort, after, before)
+    filters = query
+    if bound:
+        filters = {'$and': [query, bound]} if query else bound
+
+    docs = list(collection.find(filters, projection).sort(order).limit(per_page + 1))
+    return finish_keyset_page(docs, sort, per_page, state)
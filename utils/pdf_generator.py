@@ -1,87 +1,133 @@
-import os
-from reportlab.lib.pagesizes import letter, A4
+from reportlab.lib.pagesizes import A4
 from reportlab.pdfgen import canvas
-from reportlab.lib.utils import ImageReader
 import qrcode
 from io import BytesIO
+from utils.ticket_signing import sign_ticket
 
-def generate_ticket_pdf(booking_data):
-    """
-    Generates a PDF ticket for the given booking data.
-    booking_data: dict containing museum_name, user_name, date, tickets, booking_id
-    Returns: BytesIO object containing the PDF
-    """
-    buffer = BytesIO()
-    c = canvas.Canvas(buffer, pagesize=A4)
+# --- Design Colors ---
+PRIMARY_COLOR = (0.54, 0.27, 0.07) # #8B4513 (SaddleBrown)
+TEXT_COLOR = (0.2, 0.2, 0.2)
+
+# Everything that is identical on every ticket lives in one form XObject,
+# drawn once per document and stamped onto each page by reference.
+TEMPLATE_FORM = "TicketTemplate"
+
+QR_X, QR_Y, QR_SIZE = A4[0] - 200, A4[1] - 380, 120
+QR_MASK_PATTERN = 0
+
+def _draw_template(c):
     width, height = A4
-    
-    # --- Design Colors ---
-    primary_color = (0.54, 0.27, 0.07) # #8B4513 (SaddleBrown)
-    text_color = (0.2, 0.2, 0.2)
-    
+    c.beginForm(TEMPLATE_FORM)
+
     # --- Header ---
-    c.setFillColorRGB(*primary_color)
+    c.setFillColorRGB(*PRIMARY_COLOR)
     c.rect(0, height - 100, width, 100, fill=1, stroke=0)
-    
+
     c.setFillColorRGB(1, 1, 1) # White text
     c.setFont("Helvetica-Bold", 30)
     c.drawCentredString(width / 2, height - 60, "MUSEUM TICKET")
-    
-    # --- Museum Details ---
-    c.setFillColorRGB(*text_color)
-    c.setFont("Helvetica-Bold", 22)
-    c.drawCentredString(width / 2, height - 150, booking_data.get('museum_name', 'Museum'))
-    
+
     # --- Ticket Info Box ---
-    c.setStrokeColorRGB(*primary_color)
+    c.setStrokeColorRGB(*PRIMARY_COLOR)
     c.setLineWidth(2)
     c.rect(50, height - 400, width - 100, 200, stroke=1, fill=0)
-    
+
+    # --- Field labels ---
+    c.setFillColorRGB(*TEXT_COLOR)
+    c.setFont("Helvetica-Bold", 14)
     y_pos = height - 250
-    x_left = 80
-    x_val = 200
-    
-    c.setFont("Helvetica", 14)
-    
-    fields = [
-        ("Visitor:", booking_data.get('user_name', 'Visitor')),
-        ("Date:", booking_data.get('date', 'N/A')),
-        ("Tickets:", str(booking_data.get('tickets', 1))),
-        ("Booking ID:", str(booking_data.get('booking_id', 'N/A')))
-    ]
-    
-    for label, value in fields:
-        c.setFont("Helvetica-Bold", 14)
-        c.drawString(x_left, y_pos, label)
-        c.setFont("Helvetica", 14)
-        c.drawString(x_val, y_pos, value)
+    for label in ("Visitor:", "Date:", "Tickets:", "Booking ID:"):
+        c.drawString(80, y_pos, label)
         y_pos -= 30
-    
-    # --- QR Code ---
-    # Create QR code with Booking ID
-    qr = qrcode.QRCode(
-        version=1,
-        error_correction=qrcode.constants.ERROR_CORRECT_L,
-        box_size=10,
-        border=4,
-    )
-    qr.add_data(str(booking_data.get('booking_id')))
-    qr.make(fit=True)
-    img = qr.make_image(fill_color="black", back_color="white")
-    
-    # Save QR to a temporary buffer to draw on PDF
-    qr_buffer = BytesIO()
-    img.save(qr_buffer)
-    qr_buffer.seek(0)
-    
-    c.drawImage(ImageReader(qr_buffer), width - 200, height - 380, width=120, height=120)
+
+    c.setFont("Helvetica", 14)
     c.drawString(width - 180, height - 395, "Scan to Verify")
 
     # --- Footer ---
     c.setFont("Helvetica-Oblique", 10)
     c.drawCentredString(width / 2, 50, "Thank you for preserving our heritage. Enjoy your visit!")
     c.drawCentredString(width / 2, 35, "Generated by PixelPast Museum Management System")
-    
+
+    c.endForm()
+
+def _draw_qr(c, data, x, y, size):
+    """
+    Draws the QR code as vector modules: one filled path, with each run of
+    dark modules in a row merged into a single rectangle. No raster round trip.
+    """
+    # A fixed mask skips scoring all eight masks, which was most of the QR
+    # time for the signed payload; every scanner decodes any mask
+    qr = qrcode.QRCode(error_correction=qrcode.constants.ERROR_CORRECT_L, border=4, mask_pattern=QR_MASK_PATTERN)
+    qr.add_data(data)
+    qr.make(fit=True)
+    matrix = qr.get_matrix()  # includes the quiet-zone border
+
+    n = len(matrix)
+    cell = size / n
+    path = c.beginPath()
+    for row, modules in enumerate(matrix):
+        top = y + size - (row + 1) * cell
+        col = 0
+        while col < n:
+            if modules[col]:
+                start = col
+                while col < n and modules[col]:
+                    col += 1
+                path.rect(x + start * cell, top, (col - start) * cell, cell)
+            else:
+                col += 1
+
+    c.setFillColorRGB(0, 0, 0)
+    c.drawPath(path, fill=1, stroke=0)
+
+def _draw_ticket(c, booking_data):
+    width, height = A4
+    c.doForm(TEMPLATE_FORM)
+
+    # --- Museum Details ---
+    c.setFillColorRGB(*TEXT_COLOR)
+    c.setFont("Helvetica-Bold", 22)
+    c.drawCentredString(width / 2, height - 150, booking_data.get('museum_name', 'Museum'))
+
+    # --- Field values ---
+    c.setFont("Helvetica", 14)
+    y_pos = height - 250
+    values = [
+        booking_data.get('user_name', 'Visitor'),
+        booking_data.get('date', 'N/A'),
+        str(booking_data.get('tickets', 1)),
+        str(booking_data.get('booking_id', 'N/A'))
+    ]
+    for value in values:
+        c.drawString(200, y_pos, str(value))
+        y_pos -= 30
+
+    # --- QR Code (signed, verifiable at the gate without a DB lookup) ---
+    _draw_qr(c, sign_ticket(booking_data), QR_X, QR_Y, QR_SIZE)
+
+def generate_ticket_pdfs(bookings):
+    """
+    Renders several tickets into one multi-page PDF (group bookings, bulk
+    reissue). The static layout is defined once and reused by every page.
+    bookings: iterable of booking_data dicts (see generate_ticket_pdf)
+    Returns: BytesIO object containing the PDF
+    """
+    buffer = BytesIO()
+    c = canvas.Canvas(buffer, pagesize=A4)
+    _draw_template(c)
+
+    for booking_data in bookings:
+        _draw_ticket(c, booking_data)
+        c.showPage()
+
     c.save()
     buffer.seek(0)
     return buffer
+
+def generate_ticket_pdf(booking_data):
+    """
+    Generates a PDF ticket for the given booking data.
+    booking_data: dict containing museum_name, museum_id, user_name, date, tickets, booking_id
+    Returns: BytesIO object containing the PDF
+    """
+    return generate_ticket_pdfs([booking_data])
@@ -0,0 +1,66 @@
+import base64
+import hashlib
+import hmac
+import os
+
+# Ticket QR payloads carry everything the gate needs plus an HMAC, so a scan
+# can be checked without a database lookup:
+#   PXT1.<booking_id>.<museum_id>.<YYYY-MM-DD>.<tickets>.<signature>
+# The signature is a truncated HMAC-SHA256 (128 bits) over the fields.
+# TICKET_SIGNING_KEY should be set in production; without it the app's
+# SECRET_KEY is used. Rotating the key invalidates already issued tickets.
+
+PAYLOAD_PREFIX = 'PXT1'
+SIGNATURE_BYTES = 16
+
+class InvalidTicket(ValueError):
+    pass
+
+def _signing_key():
+    key = os.getenv('TICKET_SIGNING_KEY') or os.getenv('SECRET_KEY')
+    if not key:
+        raise RuntimeError('TICKET_SIGNING_KEY (or SECRET_KEY) must be set to sign tickets')
+    return key.encode()
+
+def _signature(body, key):
+    digest = hmac.new(key, body.encode(), hashlib.sha256).digest()[:SIGNATURE_BYTES]
+    return base64.urlsafe_b64encode(digest).rstrip(b'=').decode()
+
+def sign_ticket(booking_data):
+    """
+    Builds the signed QR payload for a booking.
+    booking_data: dict with booking_id, museum_id, date (or tour_date), tickets
+    """
+    fields = [
+        str(booking_data['booking_id']),
+        str(booking_data['museum_id']),
+        str(booking_data.get('date') or booking_data['tour_date']),
+        str(int(booking_data.get('tickets', 1)))
+    ]
+    if any('.' in f or not f for f in fields):
+        raise ValueError(f"Cannot sign ticket fields {fields}")
+    body = '.'.join([PAYLOAD_PREFIX] + fields)
+    return f"{body}.{_signature(body, _signing_key())}"
+
+def verify_ticket(payload, key=None):
+    """
+    Checks a scanned payload's signature.
+    Returns {'booking_id', 'museum_id', 'date', 'tickets'}; raises InvalidTicket.
+    """
+    if not isinstance(payload, str):
+        # JSON numbers, objects or lists from a scanner
+        raise InvalidTicket('malformed')
+    parts = payload.strip().split('.')
+    if len(parts) != 6 or parts[0] != PAYLOAD_PREFIX:
+        raise InvalidTicket('malformed')
+
+    body, signature = '.'.join(parts[:5]), parts[5]
+    expected = _signature(body, key or _signing_key())
+    if not hmac.compare_digest(signature, expected):
+        raise InvalidTicket('bad_signature')
+
+    try:
+        tickets = int(parts[4])
+    except ValueError:
+        raise InvalidTicket('malformed')
+    return {'booking_id': parts[1], 'museum_id': parts[2], 'date': parts[3], 'tickets': tickets}